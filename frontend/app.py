@@ -2,21 +2,58 @@
 Frontend Service - Entry point for the application
 Shows end-to-end tracing for different services
 """
+import os
+
 # Added for Instana because no (full) auto-discovery for this application or related services
-import instana
+# INSTANA_ENABLED=false schakelt Instana uit, bijvoorbeeld bij gebruik van de ingebouwde tracing
+if os.getenv('INSTANA_ENABLED', 'true').lower() == 'true':
+    import instana
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response
 import requests
-import os
+import orjson
 import time
 import random
 from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
 from prometheus_flask_exporter import PrometheusMetrics
 
+from fastjson import OrjsonProvider
+from page_cache import PageCache, page_not_modified
+from health import HealthChecker
+import tracing
+import deadline
+from upstream import UpstreamClient
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+tracer = tracing.init_app(app, 'frontend')
 metrics = PrometheusMetrics(app)
 
 ORDER_SERVICE_URL = os.getenv('ORDER_SERVICE_URL', 'http://order-service:8080')
+# Optioneel: payment service ook meenemen in de health checks
+PAYMENT_SERVICE_URL = os.getenv('PAYMENT_SERVICE_URL', '')
+
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '5'))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', '2'))
+# Optioneel: order service meenemen in de health checks (alleen 'degraded', nooit not ready)
+HEALTH_CHECK_ORDER_SERVICE = os.getenv('HEALTH_CHECK_ORDER_SERVICE', 'false').lower() == 'true'
+
+# Deadlines: budget per request (seconden), doorgegeven aan upstreams via X-Request-Deadline-Ms
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '10'))
+# Hedging van idempotente GETs: tweede poging na dit latency percentiel van recente calls
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv('HEDGE_DEFAULT_DELAY_MS', '100'))
+
+deadline.init_app(app, REQUEST_DEADLINE)
+order_service = UpstreamClient(
+    'order-service', ORDER_SERVICE_URL,
+    hedge_percentile=HEDGE_PERCENTILE,
+    default_hedge_delay=HEDGE_DEFAULT_DELAY_MS / 1000.0
+)
+
+# Rendered pagina's kort cachen (seconden)
+PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', '2'))
+page_cache = PageCache(ttl=PAGE_CACHE_TTL)
 
 # Prometheus metrics
 request_counter = Counter(
@@ -30,6 +67,22 @@ request_duration = Histogram(
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0]
 )
 
+def upstream_check(url):
+    """Health check: GET <url>/health moet 2xx geven"""
+    def check():
+        response = requests.get(f"{url}/health", timeout=HEALTH_CHECK_TIMEOUT)
+        response.raise_for_status()
+    return check
+
+# Upstreams zijn optioneel en niet kritiek: de frontend (index pagina) blijft in de Service
+# als de order service down is, /ready meldt dan 'degraded'
+health_checker = HealthChecker(interval=HEALTH_CHECK_INTERVAL)
+if HEALTH_CHECK_ORDER_SERVICE:
+    health_checker.add_check('order-service', upstream_check(ORDER_SERVICE_URL), critical=False)
+if PAYMENT_SERVICE_URL:
+    health_checker.add_check('payment-service', upstream_check(PAYMENT_SERVICE_URL), critical=False)
+health_checker.start()
+
 # Simple HTML template for demo
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -183,7 +236,18 @@ def index():
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "service": "frontend"}), 200
+    return jsonify({
+        "status": "healthy",
+        "service": "frontend",
+        "dependencies": health_checker.snapshot()['dependencies']
+    }), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check - gecachte upstream status van de achtergrond health checker"""
+    snapshot = health_checker.snapshot()
+    status_code = 200 if snapshot['status'] in ('ready', 'degraded') else 503
+    return jsonify(snapshot), status_code
 
 @app.route('/api/orders', methods=['POST'])
 def create_order_api():
@@ -197,13 +261,9 @@ def create_order_api():
     try:
         data = request.get_json()
         
-        # Call order service
+        # Call order service (niet idempotent: geen hedging, wel deadline)
         # Instana creëert automatisch distributed trace!
-        response = requests.post(
-            f"{ORDER_SERVICE_URL}/orders",
-            json=data,
-            timeout=10
-        )
+        response = order_service.post('/orders', json=data, timeout=10)
         
         duration = time.time() - start_time
         request_duration.observe(duration)
@@ -215,7 +275,12 @@ def create_order_api():
             status=status_label
         ).inc()
         
-        return response.json(), response.status_code
+        # Body ongewijzigd doorgeven, geen parse + herserialisatie nodig
+        return Response(
+            response.content,
+            status=response.status_code,
+            content_type=response.headers.get('Content-Type', 'application/json')
+        )
         
     except requests.exceptions.Timeout:
         request_counter.labels(endpoint='/api/orders', method='POST', status='timeout').inc()
@@ -224,14 +289,14 @@ def create_order_api():
         request_counter.labels(endpoint='/api/orders', method='POST', status='error').inc()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/orders', methods=['GET'])
-def get_orders():
-    """Haal alle orders op via order service"""
+def render_orders_page():
+    """Haal alle orders op via order service en render de tabel, geeft (html, status)"""
     try:
-        response = requests.get(f"{ORDER_SERVICE_URL}/orders", timeout=10)
+        # Idempotente read: gehedged tegen trage order-service replicas
+        response = order_service.get('/orders', timeout=10)
         
         if response.status_code == 200:
-            orders = response.json().get('orders', [])
+            orders = orjson.loads(response.content).get('orders', [])
             
             # Render simple HTML table
             html = """
@@ -283,13 +348,33 @@ def get_orders():
             </html>
             """
             
-            return html
+            return html, 200
         else:
             return f"Error fetching orders: {response.text}", response.status_code
             
     except Exception as e:
         return f"Error: {str(e)}", 500
 
+@app.route('/orders', methods=['GET'])
+def get_orders():
+    """
+    Orders pagina uit de page cache
+    Gelijktijdige requests delen één upstream fetch, browsers krijgen 304 via ETag
+    """
+    page = page_cache.get('orders', render_orders_page)
+    
+    if page.status != 200:
+        return page.body, page.status
+    
+    if page.etag in request.if_none_match:
+        page_not_modified.labels(page='orders').inc()
+        response = Response(status=304)
+    else:
+        response = Response(page.body, status=200, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/metrics', methods=['GET'])
 def metrics_endpoint():
     """Prometheus metrics endpoint"""
@@ -0,0 +1,55 @@
+"""
+Request deadlines
+- Elke binnenkomende request krijgt een deadline: de X-Request-Deadline-Ms header (resterende
+  milliseconden) of een standaard budget. Requests zonder resterende tijd krijgen een 504.
+- Uitgaande calls gebruiken min(timeout, resterend budget) en geven het restant door in de header.
+"""
+import contextvars
+import time
+
+import requests
+from prometheus_client import Counter
+
+
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+deadline_exceeded = Counter(
+    'deadline_exceeded_total',
+    'Requests or upstream calls skipped because the deadline had passed',
+    ['where']
+)
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Geen tijd meer voor een upstream call; een Timeout zodat bestaande timeout afhandeling geldt"""
+
+
+def remaining():
+    """Resterende seconden voor de huidige request, of None buiten een request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def init_app(app, default_budget):
+    """Zet per request een deadline uit de header, maximaal default_budget seconden"""
+    from flask import jsonify, request
+
+    @app.before_request
+    def _start_deadline():
+        budget = default_budget
+        header = request.headers.get(DEADLINE_HEADER)
+        if header:
+            try:
+                budget = min(budget, float(header) / 1000.0)
+            except ValueError:
+                pass
+        _deadline.set(time.monotonic() + budget)
+        if budget <= 0:
+            deadline_exceeded.labels(where='incoming').inc()
+            return jsonify({"error": "Deadline exceeded"}), 504
+
+    @app.teardown_request
+    def _clear_deadline(exc):
+        _deadline.set(None)
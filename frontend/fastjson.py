@@ -0,0 +1,39 @@
+"""
+Snelle JSON provider voor Flask op basis van orjson
+Decimal en datetime waarden worden direct geserialiseerd, zodat endpoints database
+rijen aan jsonify kunnen geven zonder eerst elke waarde in Python om te zetten.
+"""
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+
+
+def _default(obj):
+    """Types die orjson zelf niet kent"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider: app.json = OrjsonProvider(app)
+    Responses worden direct uit de orjson bytes gebouwd, zonder omweg via str.
+    """
+
+    mimetype = 'application/json'
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self.option),
+            mimetype=self.mimetype
+        )
@@ -0,0 +1,99 @@
+"""
+Achtergrond health checker
+Controleert dependencies periodiek in een achtergrond thread, zodat /health en /ready
+het gecachte resultaat kunnen serveren in plaats van per probe de dependency te raken.
+"""
+import threading
+import time
+
+from prometheus_client import Gauge
+
+
+dependency_up = Gauge(
+    'dependency_up',
+    'Whether the last health check of a dependency succeeded',
+    ['dependency']
+)
+dependency_latency = Gauge(
+    'dependency_check_latency_seconds',
+    'Duration of the last health check of a dependency',
+    ['dependency']
+)
+
+
+class HealthChecker:
+    """
+    add_check(name, func): func() geeft een exception als de dependency niet gezond is.
+    Kritieke dependencies bepalen readiness, de rest markeert de service alleen als degraded.
+    Een resultaat ouder dan stale_after seconden (standaard 3 intervallen) telt als ongezond,
+    zodat een vastgelopen check niet eindeloos de laatste 'ready' blijft tonen.
+    """
+
+    def __init__(self, interval=5.0, stale_after=None):
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self._checks = []
+        self._results = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_check(self, name, func, critical=True):
+        self._checks.append((name, func, critical))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='health-checker', daemon=True)
+            self._thread.start()
+        return self
+
+    def run_checks(self):
+        """Voer alle checks één keer uit en bewaar de resultaten"""
+        for name, func, critical in self._checks:
+            start = time.perf_counter()
+            error = None
+            try:
+                func()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            latency = time.perf_counter() - start
+
+            dependency_up.labels(dependency=name).set(0 if error else 1)
+            dependency_latency.labels(dependency=name).set(latency)
+            with self._lock:
+                self._results[name] = {
+                    "healthy": error is None,
+                    "critical": critical,
+                    "latency_ms": round(latency * 1000, 2),
+                    "error": error,
+                    "checked_at": time.time()
+                }
+
+    def snapshot(self):
+        """Gecachte status: starting, ready, degraded of not ready"""
+        now = time.time()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+
+        for result in results.values():
+            age = now - result['checked_at']
+            if age > self.stale_after:
+                result['healthy'] = False
+                result['error'] = f"stale: last checked {age:.0f}s ago"
+
+        if len(results) < len(self._checks):
+            status = 'starting'
+        elif any(not r['healthy'] for r in results.values() if r['critical']):
+            status = 'not ready'
+        elif any(not r['healthy'] for r in results.values()):
+            status = 'degraded'
+        else:
+            status = 'ready'
+        return {"status": status, "dependencies": results}
+
+    def _run(self):
+        while True:
+            try:
+                self.run_checks()
+            except Exception as e:
+                print(f"Health checker error: {e}")
+            time.sleep(self.interval)
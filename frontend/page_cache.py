@@ -0,0 +1,82 @@
+"""
+Page cache voor de frontend
+Korte TTL cache voor gerenderde pagina's met single-flight coalescing: gelijktijdige
+requests voor dezelfde key delen één upstream fetch in plaats van er allemaal één te doen.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from prometheus_client import Counter
+
+
+page_cache_requests = Counter(
+    'frontend_page_cache_requests_total',
+    'Page cache lookups by result',
+    ['page', 'result']
+)
+page_not_modified = Counter(
+    'frontend_page_not_modified_total',
+    'Responses answered with 304 Not Modified',
+    ['page']
+)
+
+CachedPage = namedtuple('CachedPage', ['body', 'status', 'etag', 'expires'])
+
+
+class _Call:
+    """Lopende upstream fetch, gedeeld door de leader en zijn followers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.page = None
+        self.error = None
+
+
+class PageCache:
+    """
+    get(key, loader) geeft een CachedPage terug. loader() geeft (body, status);
+    alleen pagina's met status 200 worden bewaard, ttl seconden lang.
+    """
+
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                page_cache_requests.labels(page=key, result='hit').inc()
+                return entry
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            # Wacht op de fetch die al loopt
+            page_cache_requests.labels(page=key, result='coalesced').inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.page
+
+        page_cache_requests.labels(page=key, result='miss').inc()
+        try:
+            body, status = loader()
+            etag = hashlib.sha1(body.encode()).hexdigest()
+            call.page = CachedPage(body, status, etag, time.monotonic() + self.ttl)
+            return call.page
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if call.page is not None and call.page.status == 200:
+                    self._entries[key] = call.page
+                del self._inflight[key]
+            call.done.set()
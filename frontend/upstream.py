@@ -0,0 +1,185 @@
+"""
+Upstream client met deadlines en gehedgede reads
+- Calls respecteren de deadline van de huidige request (zie deadline.py)
+- Idempotente GETs worden gehedged: als de eerste poging na het ingestelde latency
+  percentiel van recente calls nog geen antwoord heeft, gaat er een tweede poging
+  uit en wint het eerste antwoord. Het percentiel wordt per (method, path) bijgehouden.
+- Elke client heeft een eigen, begrensde pool voor de pogingen; is die vol, dan loopt
+  de call zonder hedge op de request thread in plaats van in een wachtrij te staan.
+"""
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from prometheus_client import Counter, Gauge, Histogram
+
+from deadline import DEADLINE_HEADER, DeadlineExceeded, deadline_exceeded, remaining
+
+
+upstream_requests = Counter(
+    'upstream_requests_total',
+    'Upstream attempts sent, including hedges',
+    ['upstream', 'method']
+)
+upstream_duration = Histogram(
+    'upstream_request_duration_seconds',
+    'Upstream call duration as seen by the caller (after hedging)',
+    ['upstream', 'method'],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+upstream_hedges = Counter(
+    'upstream_hedged_requests_total',
+    'Hedge attempts sent because the first attempt was slower than the hedge delay',
+    ['upstream']
+)
+upstream_hedge_wins = Counter(
+    'upstream_hedge_wins_total',
+    'Hedged calls where the hedge attempt answered first',
+    ['upstream']
+)
+upstream_hedges_skipped = Counter(
+    'upstream_hedges_skipped_total',
+    'Hedgeable calls sent without (or without a second) attempt because the attempt pool was full',
+    ['upstream']
+)
+upstream_hedge_delay = Gauge(
+    'upstream_hedge_delay_seconds',
+    'Hedge delay of the last hedged call (latency percentile of recent calls to its path)',
+    ['upstream']
+)
+
+
+class UpstreamClient:
+    """
+    Calls naar één upstream service
+    get(..., hedge=True) hedget idempotente reads; post() respecteert alleen de deadline.
+    Alleen gehedgede calls voeden de latency windows (één per method en path, maximaal
+    max_windows), zodat trage POSTs of andere endpoints de hedge delay niet beïnvloeden.
+    max_concurrency begrenst de pogingen die tegelijk in de pool van deze client lopen.
+    """
+
+    def __init__(self, name, base_url, hedge_percentile=95, default_hedge_delay=0.1,
+                 min_hedge_delay=0.01, min_samples=20, window=200, max_windows=100,
+                 max_concurrency=32):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_windows = max_windows
+        self._latencies = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f'upstream-{name}')
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def get(self, path, timeout, hedge=True, **kwargs):
+        start = time.monotonic()
+        try:
+            if hedge:
+                return self._hedged('GET', path, timeout, **kwargs)
+            return self._attempt('GET', path, timeout, **kwargs)
+        finally:
+            upstream_duration.labels(upstream=self.name, method='GET').observe(time.monotonic() - start)
+
+    def post(self, path, timeout, **kwargs):
+        start = time.monotonic()
+        try:
+            return self._attempt('POST', path, timeout, **kwargs)
+        finally:
+            upstream_duration.labels(upstream=self.name, method='POST').observe(time.monotonic() - start)
+
+    def hedge_delay(self, method, path):
+        """Latency percentiel van recente pogingen naar path, default_hedge_delay tot er genoeg samples zijn"""
+        with self._lock:
+            samples = sorted(self._latencies.get(self._key(method, path), ()))
+        if len(samples) < self.min_samples:
+            return self.default_hedge_delay
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100.0))
+        return max(self.min_hedge_delay, samples[index])
+
+    def _attempt(self, method, path, timeout, **kwargs):
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                deadline_exceeded.labels(where=self.name).inc()
+                raise DeadlineExceeded(f"Deadline exceeded before calling {self.name}")
+            timeout = min(timeout, left)
+            headers = dict(kwargs.pop('headers', None) or {})
+            headers[DEADLINE_HEADER] = str(int(left * 1000))
+            kwargs['headers'] = headers
+
+        upstream_requests.labels(upstream=self.name, method=method).inc()
+        return requests.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+
+    @staticmethod
+    def _key(method, path):
+        return method, path.partition('?')[0]
+
+    def _record(self, method, path, latency):
+        key = self._key(method, path)
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None:
+                samples = self._latencies[key] = deque(maxlen=self.window)
+                while len(self._latencies) > self.max_windows:
+                    self._latencies.popitem(last=False)
+            self._latencies.move_to_end(key)
+            samples.append(latency)
+
+    def _measured(self, method, path, timeout, **kwargs):
+        start = time.monotonic()
+        try:
+            return self._attempt(method, path, timeout, **kwargs)
+        finally:
+            self._slots.release()
+            self._record(method, path, time.monotonic() - start)
+
+    def _submit(self, *args, **kwargs):
+        """Poging in de pool van deze client, of None als alle plekken bezet zijn"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        # Eigen kopie van de context per poging: deadline en trace context gaan mee naar de worker thread
+        try:
+            return self._executor.submit(contextvars.copy_context().run, self._measured, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _hedged(self, method, path, timeout, **kwargs):
+        delay = self.hedge_delay(method, path)
+        upstream_hedge_delay.labels(upstream=self.name).set(delay)
+
+        first = self._submit(method, path, timeout, **kwargs)
+        if first is None:
+            # Pool vol: niet in een wachtrij, maar zonder hedge op de request thread
+            upstream_hedges_skipped.labels(upstream=self.name).inc()
+            return self._attempt(method, path, timeout, **kwargs)
+        done, _ = wait([first], timeout=delay)
+        left = remaining()
+        if done or (left is not None and left <= 0):
+            return first.result()
+
+        second = self._submit(method, path, timeout, **kwargs)
+        if second is None:
+            upstream_hedges_skipped.labels(upstream=self.name).inc()
+            return first.result()
+        upstream_hedges.labels(upstream=self.name).inc()
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    upstream_hedge_wins.labels(upstream=self.name).inc()
+                return response
+        raise error
@@ -2,23 +2,44 @@
 Order Service - Demonstratie voor Instana vs OpenShift Monitoring
 Bevat zowel automatische Instana instrumentatie als handmatige Prometheus metrics
 """
+import os
+
 # Added for Instana because no (full) auto-discovery for this application or related services
-import instana
+# INSTANA_ENABLED=false schakelt Instana uit, bijvoorbeeld bij gebruik van de ingebouwde tracing
+if os.getenv('INSTANA_ENABLED', 'true').lower() == 'true':
+    import instana
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import requests
-import psycopg2
-import os
 import time
+import contextvars
 import random
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
 # Prometheus metrics (voor OpenShift native monitoring)
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, REGISTRY
 from prometheus_flask_exporter import PrometheusMetrics
 
+from group_commit import GroupCommitWriter
+from db_router import PoolExhausted, ShardMappingError, configure_order_ids, router_from_env
+from health import HealthChecker
+import tracing
+import deadline
+from upstream import UpstreamClient
+from fastjson import OrjsonProvider
+from order_events import OrderEventHub, PgNotifyListener, NOTIFY_TRIGGER_SQL
+import export
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Ingebouwde tracing (TRACING_ENABLED=true): Flask, psycopg2 en requests spans
+tracer = tracing.init_app(app, 'order-service')
 
 # Prometheus metrics setup
 metrics = PrometheusMetrics(app)
@@ -43,31 +64,251 @@ database_errors = Counter(
     'Total database errors'
 )
 
-# Database configuratie
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'postgres'),
-    'port': os.getenv('DB_PORT', '5432'),
-    'database': os.getenv('DB_NAME', 'orders'),
-    'user': os.getenv('DB_USER', 'admin'),
-    'password': os.getenv('DB_PASSWORD', 'password123')
+PAYMENT_SERVICE_URL = os.getenv('PAYMENT_SERVICE_URL', 'http://payment-service:8080')
+
+# Group commit: bundel inserts/updates van gelijktijdige requests in één transactie
+GROUP_COMMIT_ENABLED = os.getenv('GROUP_COMMIT_ENABLED', 'false').lower() == 'true'
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', '50'))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', '5'))
+GROUP_COMMIT_TIMEOUT = float(os.getenv('GROUP_COMMIT_TIMEOUT', '5'))
+
+# Stored procedures: insert en status update elk in één round trip (autocommit)
+STORED_PROCEDURES_ENABLED = os.getenv('STORED_PROCEDURES_ENABLED', 'false').lower() == 'true'
+
+# Order status events: LISTEN/NOTIFY zodat events ook van andere replicas binnenkomen
+ORDER_EVENTS_LISTEN = os.getenv('ORDER_EVENTS_LISTEN', 'false').lower() == 'true'
+ORDER_EVENTS_TIMEOUT = float(os.getenv('ORDER_EVENTS_TIMEOUT', '30'))
+ORDER_EVENTS_HEARTBEAT = float(os.getenv('ORDER_EVENTS_HEARTBEAT', '15'))
+
+# Health checks draaien op de achtergrond, /health en /ready serveren het resultaat
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '5'))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', '2'))
+HEALTH_CHECK_PAYMENT = os.getenv('HEALTH_CHECK_PAYMENT', 'false').lower() == 'true'
+
+# Deadlines: budget per request (seconden), doorgegeven aan upstreams via X-Request-Deadline-Ms
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '10'))
+# Hedging van idempotente GETs: tweede poging na dit latency percentiel van recente calls
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv('HEDGE_DEFAULT_DELAY_MS', '100'))
+
+# Kolommen van SELECT * FROM orders, in tabel volgorde
+ORDER_COLUMNS = ('id', 'customer_name', 'product', 'amount', 'status', 'payment_status', 'created_at')
+
+# Prepared statements per pooled connectie: naam -> (parameter types, query)
+PREPARED_STATEMENTS = {
+    'get_orders': ('', "SELECT * FROM orders ORDER BY created_at DESC NULLS LAST LIMIT 100"),
+    'get_order': ('(integer)', "SELECT * FROM orders WHERE id = $1"),
 }
 
-PAYMENT_SERVICE_URL = os.getenv('PAYMENT_SERVICE_URL', 'http://payment-service:8080')
+ORDER_FUNCTIONS_SQL = """
+    CREATE OR REPLACE FUNCTION order_create(
+        p_customer_name VARCHAR, p_product VARCHAR, p_amount DECIMAL
+    ) RETURNS INTEGER AS $$
+        INSERT INTO orders (customer_name, product, amount, status, payment_status)
+        VALUES (p_customer_name, p_product, p_amount, 'pending', 'pending')
+        RETURNING id
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION order_finalize(
+        p_id INTEGER, p_status VARCHAR, p_payment_status VARCHAR
+    ) RETURNS INTEGER AS $$
+        UPDATE orders SET status = p_status, payment_status = p_payment_status
+        WHERE id = p_id
+        RETURNING id
+    $$ LANGUAGE sql;
+"""
+
+# Routing: read replicas en customer-hash sharding (DB_SHARDS, DB_REPLICA_HOSTS),
+# connection pool per node (DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT)
+db_router = router_from_env(tracing.traced_cursor_factory(tracer) if tracer else None)
 
-def get_db_connection():
-    """Database connectie - Instana traceert dit automatisch!"""
+# Voor scatter-gather reads over alle shards: genoeg workers om elke pool connectie te gebruiken
+shard_executor = ThreadPoolExecutor(
+    max_workers=sum(shard.primary.pool_max for shard in db_router.shards),
+    thread_name_prefix='shard-read'
+)
+
+def get_db_connection(node=None, **overrides):
+    """Database connectie (standaard de primary van de eerste shard) - Instana traceert dit automatisch!"""
+    node = node or db_router.shards[0].primary
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = node.connect(**overrides)
         return conn
     except Exception as e:
         database_errors.inc()
         print(f"Database error: {e}")
         raise
 
+@contextmanager
+def pooled_connection(node):
+    """Leen een connectie uit de pool van een node (autocommit); bij een fout wordt hij gesloten"""
+    try:
+        conn = node.getconn()
+    except PoolExhausted:
+        # Overbelasting, geen database fout: de endpoints antwoorden met 503
+        raise
+    except Exception as e:
+        database_errors.inc()
+        print(f"Database error: {e}")
+        raise
+    try:
+        conn.autocommit = True
+        yield conn
+    except Exception:
+        node.putconn(conn, close=True)
+        raise
+    node.putconn(conn)
+
+def execute_prepared(conn, cur, name, params=()):
+    """Voer een prepared statement uit, PREPARE alleen de eerste keer per connectie"""
+    if name not in conn.prepared:
+        types, query = PREPARED_STATEMENTS[name]
+        cur.execute(f"PREPARE {name} {types} AS {query}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+deadline.init_app(app, REQUEST_DEADLINE)
+payment_service = UpstreamClient(
+    'payment-service', PAYMENT_SERVICE_URL,
+    hedge_percentile=HEDGE_PERCENTILE,
+    default_hedge_delay=HEDGE_DEFAULT_DELAY_MS / 1000.0
+)
+
+# Eén group commit writer per shard primary
+group_writers = [
+    GroupCommitWriter(
+        # Connect begrensd: de callers wachten ook niet langer dan GROUP_COMMIT_TIMEOUT
+        lambda node=shard.primary: get_db_connection(node, connect_timeout=max(1, int(GROUP_COMMIT_TIMEOUT))),
+        max_batch_size=GROUP_COMMIT_MAX_BATCH,
+        max_delay=GROUP_COMMIT_MAX_DELAY_MS / 1000.0
+    )
+    for shard in db_router.shards
+] if GROUP_COMMIT_ENABLED else None
+
+# NOTIFY wordt niet gerepliceerd: per shard primary één listener
+order_events = OrderEventHub()
+order_listeners = [
+    PgNotifyListener(lambda node=shard.primary: get_db_connection(node), order_events)
+    for shard in db_router.shards
+] if ORDER_EVENTS_LISTEN else None
+
+@contextmanager
+def write_connection(shard):
+    """Gepoolde connectie naar de shard primary voor een write, of None als de group commit writer schrijft"""
+    if group_writers is not None:
+        yield None
+        return
+    with pooled_connection(shard.primary) as conn:
+        yield conn
+
+def insert_order(conn, data):
+    """Insert order met status pending - via group commit writer indien actief"""
+    if group_writers is not None:
+        shard = db_router.shard_for_customer(data['customer_name'])
+        future = group_writers[shard.index].insert_order(data['customer_name'], data['product'], data['amount'])
+        order_id = future.result(timeout=GROUP_COMMIT_TIMEOUT)
+        db_router.note_write(order_id)
+        return order_id
+
+    cur = conn.cursor()
+    if STORED_PROCEDURES_ENABLED:
+        cur.execute(
+            "SELECT order_create(%s, %s, %s)",
+            (data['customer_name'], data['product'], data['amount'])
+        )
+        order_id = cur.fetchone()[0]
+        cur.close()
+        db_router.note_write(order_id)
+        return order_id
+
+    # Instana traceert deze query automatisch!
+    cur.execute(
+        """
+        INSERT INTO orders (customer_name, product, amount, status, payment_status)
+        VALUES (%s, %s, %s, %s, %s) RETURNING id
+        """,
+        (data['customer_name'], data['product'], data['amount'], 'pending', 'pending')
+    )
+    order_id = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    db_router.note_write(order_id)
+    return order_id
+
+def update_order_status(conn, order_id, status, payment_status):
+    """Update order status - via group commit writer indien actief"""
+    if group_writers is not None:
+        writer = group_writers[db_router.shard_for_order(order_id).index]
+        writer.update_status(order_id, status, payment_status).result(timeout=GROUP_COMMIT_TIMEOUT)
+    elif STORED_PROCEDURES_ENABLED:
+        cur = conn.cursor()
+        cur.execute("SELECT order_finalize(%s, %s, %s)", (order_id, status, payment_status))
+        cur.close()
+    else:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE orders SET status = %s, payment_status = %s WHERE id = %s",
+            (status, payment_status, order_id)
+        )
+        conn.commit()
+        cur.close()
+
+    db_router.note_write(order_id)
+
+    # Wachtende /events clients op deze replica direct informeren
+    order_events.publish(order_id, status, payment_status)
+
+def check_database(node):
+    """
+    Health check: SELECT 1 op een eigen probe connectie per node, los van de pool,
+    zodat een volle pool onder load de primary niet als down markeert.
+    Connect en query zijn begrensd door HEALTH_CHECK_TIMEOUT.
+    """
+    probe = {}
+    def check():
+        conn = probe.get('conn')
+        if conn is None or conn.closed:
+            conn = probe['conn'] = node.connect(
+                connect_timeout=max(1, int(HEALTH_CHECK_TIMEOUT)),
+                options=f"-c statement_timeout={int(HEALTH_CHECK_TIMEOUT * 1000)}"
+            )
+            conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+        except Exception:
+            probe.pop('conn', None)
+            conn.close()
+            raise
+    return check
+
+def check_payment_service():
+    response = requests.get(f"{PAYMENT_SERVICE_URL}/health", timeout=HEALTH_CHECK_TIMEOUT)
+    response.raise_for_status()
+
+# Primaries bepalen readiness, replicas en payment service alleen 'degraded'
+health_checker = HealthChecker(interval=HEALTH_CHECK_INTERVAL)
+for shard in db_router.shards:
+    health_checker.add_check(f"postgres-{shard.primary.name}", check_database(shard.primary))
+    for replica in shard.replicas:
+        health_checker.add_check(f"postgres-{replica.name}", check_database(replica), critical=False)
+if HEALTH_CHECK_PAYMENT:
+    health_checker.add_check('payment-service', check_payment_service, critical=False)
+health_checker.start()
+
 def init_db():
-    """Initialiseer database schema"""
+    """Initialiseer database schema op elke shard primary"""
+    for shard in db_router.shards:
+        init_shard(shard)
+
+def init_shard(shard):
+    """Initialiseer database schema op één shard"""
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(shard.primary)
         cur = conn.cursor()
         cur.execute("""
             CREATE TABLE IF NOT EXISTS orders (
@@ -80,27 +321,36 @@ def init_db():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        if STORED_PROCEDURES_ENABLED:
+            cur.execute(ORDER_FUNCTIONS_SQL)
+        if ORDER_EVENTS_LISTEN:
+            cur.execute(NOTIFY_TRIGGER_SQL)
+        configure_order_ids(cur, shard.index, len(db_router.shards))
         conn.commit()
         cur.close()
         conn.close()
-        print("Database initialized")
+        print(f"Database initialized ({shard.primary.name})")
+    except ShardMappingError:
+        # Niet starten: orders op deze shard zouden onvindbaar zijn
+        raise
     except Exception as e:
-        print(f"Failed to initialize database: {e}")
+        print(f"Failed to initialize database {shard.primary.name}: {e}")
 
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "order-service"}), 200
+    """Health check endpoint - liveness, met de laatst bekende status van de dependencies"""
+    return jsonify({
+        "status": "healthy",
+        "service": "order-service",
+        "dependencies": health_checker.snapshot()['dependencies']
+    }), 200
 
 @app.route('/ready', methods=['GET'])
 def ready():
-    """Readiness check - controleert database connectie"""
-    try:
-        conn = get_db_connection()
-        conn.close()
-        return jsonify({"status": "ready"}), 200
-    except:
-        return jsonify({"status": "not ready"}), 503
+    """Readiness check - gecachte database status van de achtergrond health checker"""
+    snapshot = health_checker.snapshot()
+    status_code = 200 if snapshot['status'] in ('ready', 'degraded') else 503
+    return jsonify(snapshot), status_code
 
 @app.route('/orders', methods=['POST'])
 def create_order():
@@ -126,31 +376,31 @@ def create_order():
         processing_delay = random.uniform(0.05, 0.3)
         time.sleep(processing_delay)
         
+        # Geen tijd meer over voor de caller: order niet meer aanmaken
+        left = deadline.remaining()
+        if left is not None and left <= 0:
+            deadline.deadline_exceeded.labels(where='create_order').inc()
+            order_counter.labels(status='failed', payment_status='none').inc()
+            active_orders.dec()
+            return jsonify({"error": "Deadline exceeded"}), 504
+        
         # Simuleer errors (10% van de tijd)
         if random.random() < 0.1:
             order_counter.labels(status='failed', payment_status='none').inc()
             active_orders.dec()
             return jsonify({"error": "Random error occurred"}), 500
         
-        # Maak order in database
-        # Instana traceert deze query automatisch!
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO orders (customer_name, product, amount, status, payment_status)
-            VALUES (%s, %s, %s, %s, %s) RETURNING id
-            """,
-            (data['customer_name'], data['product'], data['amount'], 'pending', 'pending')
-        )
-        order_id = cur.fetchone()[0]
-        conn.commit()
+        # Maak order in database, op een gepoolde connectie (autocommit: geen BEGIN/COMMIT
+        # round trips, en met stored procedures geen connect per order)
+        shard = db_router.shard_for_customer(data['customer_name'])
+        with write_connection(shard) as conn:
+            order_id = insert_order(conn, data)
         
         # Call payment service
         # Instana traceert deze external call automatisch en maakt dependency map!
         try:
-            payment_response = requests.post(
-                f"{PAYMENT_SERVICE_URL}/payments",
+            payment_response = payment_service.post(
+                '/payments',
                 json={
                     "order_id": order_id,
                     "amount": data['amount'],
@@ -161,27 +411,21 @@ def create_order():
             
             payment_status = 'completed' if payment_response.status_code == 200 else 'failed'
             
-            # Update order status
-            cur.execute(
-                "UPDATE orders SET status = %s, payment_status = %s WHERE id = %s",
-                ('completed' if payment_status == 'completed' else 'failed', payment_status, order_id)
-            )
-            conn.commit()
+            # Update order status (connectie pas nu lenen, niet vasthouden tijdens de payment call)
+            with write_connection(shard) as conn:
+                update_order_status(
+                    conn, order_id,
+                    'completed' if payment_status == 'completed' else 'failed', payment_status
+                )
             
         except requests.exceptions.Timeout:
             payment_status = 'timeout'
-            cur.execute(
-                "UPDATE orders SET status = %s, payment_status = %s WHERE id = %s",
-                ('failed', payment_status, order_id)
-            )
-            conn.commit()
+            with write_connection(shard) as conn:
+                update_order_status(conn, order_id, 'failed', payment_status)
         except Exception as e:
             print(f"Payment service error: {e}")
             payment_status = 'error'
         
-        cur.close()
-        conn.close()
-        
         # Metrics
         duration = time.time() - start_time
         order_duration.observe(duration)
@@ -198,72 +442,206 @@ def create_order():
             "processing_time": duration
         }), 201 if payment_status == 'completed' else 500
         
+    except PoolExhausted as e:
+        active_orders.dec()
+        order_counter.labels(status='error', payment_status='none').inc()
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         active_orders.dec()
         order_counter.labels(status='error', payment_status='error').inc()
         print(f"Error creating order: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/orders', methods=['GET'])
-def get_orders():
-    """Haal alle orders op - demonstreert database query tracing"""
-    try:
-        conn = get_db_connection()
+def fetch_shard_orders(shard):
+    """Laatste 100 orders van één shard, van een replica of na een recente write van de primary"""
+    with pooled_connection(db_router.reader_for_listing(shard)) as conn:
         cur = conn.cursor()
         
         # Instana traceert deze query!
-        cur.execute("SELECT * FROM orders ORDER BY created_at DESC LIMIT 100")
+        execute_prepared(conn, cur, 'get_orders')
         orders = cur.fetchall()
         
         cur.close()
-        conn.close()
+    return orders
+
+def fetch_recent_orders(limit=100):
+    """Scatter-gather: per shard de nieuwste orders, samengevoegd op created_at DESC (NULLs laatst)"""
+    if len(db_router.shards) == 1:
+        return fetch_shard_orders(db_router.shards[0])
+    
+    # Elke shard query in een kopie van de context, zodat hij onder de request span valt
+    futures = [
+        shard_executor.submit(contextvars.copy_context().run, fetch_shard_orders, shard)
+        for shard in db_router.shards
+    ]
+    per_shard = [future.result() for future in futures]
+    merged = heapq.merge(*per_shard, key=lambda o: o[6] or datetime.min, reverse=True)
+    return list(itertools.islice(merged, limit))
+
+@app.route('/orders', methods=['GET'])
+def get_orders():
+    """Haal alle orders op - demonstreert database query tracing"""
+    try:
+        orders = fetch_recent_orders()
         
-        return jsonify({
-            "orders": [
-                {
-                    "id": o[0],
-                    "customer_name": o[1],
-                    "product": o[2],
-                    "amount": float(o[3]),
-                    "status": o[4],
-                    "payment_status": o[5],
-                    "created_at": o[6].isoformat() if o[6] else None
-                }
-                for o in orders
-            ]
-        }), 200
+        # Decimal en datetime worden door de JSON provider zelf geserialiseerd
+        return jsonify({"orders": [dict(zip(ORDER_COLUMNS, o)) for o in orders]}), 200
         
+    except PoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         database_errors.inc()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/orders/<int:order_id>', methods=['GET'])
-def get_order(order_id):
-    """Haal specifieke order op"""
+@app.route('/orders/export', methods=['GET'])
+def export_orders():
+    """
+    Exporteer orders als Parquet of Arrow IPC stream voor analytics
+    Query parameters: format, compression, since, until (ISO timestamps)
+    """
+    fmt = request.args.get('format', 'parquet')
+    compression = request.args.get('compression', 'zstd')
+    
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+    if compression not in export.COMPRESSIONS or (fmt == 'arrow' and compression not in ('zstd', 'none')):
+        return jsonify({"error": f"Unsupported compression: {compression}"}), 400
+    
+    try:
+        since = export.parse_timestamp(request.args.get('since'))
+        until = export.parse_timestamp(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    conns = []
     try:
-        conn = get_db_connection()
+        for shard in db_router.shards:
+            conns.append(get_db_connection(shard.reader()))
+    except Exception as e:
+        for conn in conns:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        try:
+            batches = export.iter_sharded_batches(conns, since=since, until=until)
+            yield from export.stream_export(batches, fmt, compression)
+        except Exception as e:
+            database_errors.inc()
+            print(f"Export error: {e}")
+            raise
+        finally:
+            for conn in conns:
+                conn.close()
+    
+    extension = 'parquet' if fmt == 'parquet' else 'arrows'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=export.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=orders.{extension}"}
+    )
+
+def fetch_order(order_id):
+    """Lees één order als dict, of None als hij niet bestaat"""
+    # Net geschreven orders van de primary, anders van een replica van de juiste shard
+    with pooled_connection(db_router.reader_for_order(order_id)) as conn:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
+        execute_prepared(conn, cur, 'get_order', (order_id,))
         order = cur.fetchone()
         cur.close()
-        conn.close()
+    return dict(zip(ORDER_COLUMNS, order)) if order else None
+
+@app.route('/orders/<int:order_id>', methods=['GET'])
+def get_order(order_id):
+    """Haal specifieke order op"""
+    try:
+        order = fetch_order(order_id)
         
         if not order:
             return jsonify({"error": "Order not found"}), 404
         
-        return jsonify({
-            "id": order[0],
-            "customer_name": order[1],
-            "product": order[2],
-            "amount": float(order[3]),
-            "status": order[4],
-            "payment_status": order[5],
-            "created_at": order[6].isoformat() if order[6] else None
-        }), 200
+        return jsonify(order), 200
         
+    except PoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        database_errors.inc()
+        return jsonify({"error": str(e)}), 500
+
+def order_done_event_id(order_id):
+    return f"{order_id}-done"
+
+def order_sse_event(order):
+    """SSE event voor een order: 'status' zolang hij pending is, daarna 'done' met een id"""
+    data = app.json.dumps(order)
+    if order['payment_status'] == 'pending':
+        return f"event: status\ndata: {data}\n\n"
+    return f"id: {order_done_event_id(order['id'])}\nevent: done\ndata: {data}\n\n"
+
+@app.route('/orders/<int:order_id>/events', methods=['GET'])
+def order_events_stream(order_id):
+    """
+    Wacht op een status wijziging van een order in plaats van te pollen
+    - Accept: text/event-stream -> Server-Sent Events, heartbeat tot de order klaar is;
+      de eindstatus komt als 'done' event met een id
+    - anders long-poll: antwoordt zodra payment_status niet meer pending is, of na timeout
+    """
+    timeout = min(request.args.get('timeout', ORDER_EVENTS_TIMEOUT, type=float), ORDER_EVENTS_TIMEOUT)
+    
+    # EventSource reconnect na het 'done' event: 204 laat de browser stoppen, zonder DB read
+    if request.headers.get('Last-Event-ID') == order_done_event_id(order_id):
+        return Response(status=204)
+    
+    # Eerst subscriben, dan lezen: zo kan geen update tussen lezen en wachten verloren gaan
+    sub = order_events.subscribe(order_id)
+    try:
+        order = fetch_order(order_id)
+    except PoolExhausted as e:
+        sub.close()
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
+        sub.close()
         database_errors.inc()
         return jsonify({"error": str(e)}), 500
+    
+    if not order:
+        sub.close()
+        return jsonify({"error": "Order not found"}), 404
+    
+    if request.accept_mimetypes.best == 'text/event-stream':
+        def generate():
+            with sub:
+                yield order_sse_event(order)
+                if order['payment_status'] != 'pending':
+                    return
+                ends_at = time.monotonic() + timeout
+                while True:
+                    remaining = ends_at - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    event = sub.wait(min(ORDER_EVENTS_HEARTBEAT, remaining))
+                    if event is not None:
+                        order.update(event)
+                        yield order_sse_event(order)
+                        return
+                    yield ": heartbeat\n\n"
+        
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        # Ook afmelden als de client weg is voordat de generator ooit gestart is
+        response.call_on_close(sub.close)
+        return response
+    
+    with sub:
+        if order['payment_status'] == 'pending':
+            event = sub.wait(timeout)
+            if event is not None:
+                order.update(event)
+    
+    return jsonify(order), 200
 
 @app.route('/metrics', methods=['GET'])
 def metrics_endpoint():
@@ -0,0 +1,281 @@
+"""
+Database routing voor de order service
+- Writes gaan naar de primary van een shard, gekozen op een hash van customer_name
+- Reads gaan naar de replicas van een shard, behalve voor orders die net geschreven zijn
+  (en de order lijst van een shard waar dit proces net op schreef)
+- Order ids zijn per shard congruent modulo het aantal shards, zodat een id zelf
+  aangeeft op welke shard de order staat
+
+Migratie naar (of tussen) shard aantallen: de mapping (id - 1) % N geldt alleen voor ids
+die zijn uitgegeven nadat de sequences voor N shards zijn ingesteld. Bestaande orders
+moeten eerst naar hun shard verplaatst worden (en de sequences opnieuw gezet); zolang
+een shard orders bevat die volgens de mapping elders horen, weigert init_db te starten.
+
+Read-your-writes is per proces: een order die net op een andere replica van de service
+geschreven is, kan hier nog van een (achterlopende) read replica gelezen worden.
+"""
+import itertools
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connectie die bijhoudt welke statements al geprepared zijn"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.pooled = False
+
+
+class PoolExhausted(Exception):
+    """Pool en overflow connecties zijn allemaal in gebruik; de database is overbelast"""
+
+
+class DbNode:
+    """
+    Eén Postgres instance met een lazy aangemaakte connection pool
+    ThreadedConnectionPool wacht zelf niet als hij vol is; getconn() wacht daarom
+    maximaal pool_timeout seconden op een vrije plek en gebruikt daarna één van
+    maximaal pool_overflow losse connecties. Zijn die ook op, dan PoolExhausted,
+    zodat overbelasting niet tot nog meer connecties naar Postgres leidt.
+    """
+
+    def __init__(self, config, pool_min=1, pool_max=10, pool_timeout=1.0, pool_overflow=5):
+        self.config = config
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.pool_timeout = pool_timeout
+        self.pool_overflow = pool_overflow
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(pool_max)
+        self._overflow = threading.BoundedSemaphore(pool_overflow) if pool_overflow else None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return f"{self.config['host']}:{self.config['port']}"
+
+    def connect(self, **overrides):
+        return psycopg2.connect(**{**self.config, **overrides})
+
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.pool_min, self.pool_max,
+                        connection_factory=PreparedConnection,
+                        **self.config
+                    )
+        return self._pool
+
+    def getconn(self):
+        """Connectie uit de pool, of een overflow connectie als de pool te lang vol blijft"""
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            if self._overflow is None or not self._overflow.acquire(blocking=False):
+                raise PoolExhausted(f"No free database connection for {self.name}")
+            try:
+                return psycopg2.connect(connection_factory=PreparedConnection, **self.config)
+            except Exception:
+                self._overflow.release()
+                raise
+        try:
+            conn = self.pool().getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        conn.pooled = True
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Geef een connectie van getconn() terug; losse connecties worden gesloten"""
+        if not conn.pooled:
+            try:
+                conn.close()
+            finally:
+                self._overflow.release()
+            return
+        try:
+            self.pool().putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+
+class Shard:
+    """Primary plus nul of meer read replicas; reads gaan round-robin over de replicas"""
+
+    def __init__(self, index, primary, replicas=()):
+        self.index = index
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._next = itertools.count()
+
+    def reader(self):
+        if not self.replicas:
+            return self.primary
+        return self.replicas[next(self._next) % len(self.replicas)]
+
+
+class DbRouter:
+    """Kiest de juiste node per query; houdt recente writes bij voor read-your-writes"""
+
+    def __init__(self, shards, read_your_writes_window=5.0):
+        self.shards = shards
+        self.read_your_writes_window = read_your_writes_window
+        self._recent_writes = OrderedDict()
+        self._shard_writes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def primaries(self):
+        return [shard.primary for shard in self.shards]
+
+    def shard_for_customer(self, customer_name):
+        """Stabiele hash (crc32, niet Python's hash()) zodat alle replicas dezelfde shard kiezen"""
+        return self.shards[zlib.crc32(customer_name.encode()) % len(self.shards)]
+
+    def shard_for_order(self, order_id):
+        return self.shards[(order_id - 1) % len(self.shards)]
+
+    def note_write(self, order_id):
+        """Order is net geschreven: lees hem de komende window seconden van de primary (alleen in dit proces)"""
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[order_id] = now + self.read_your_writes_window
+            self._shard_writes[self.shard_for_order(order_id).index] = now + self.read_your_writes_window
+            self._recent_writes.move_to_end(order_id)
+            while self._recent_writes:
+                oldest, expires = next(iter(self._recent_writes.items()))
+                if expires > now:
+                    break
+                del self._recent_writes[oldest]
+
+    def reader_for_order(self, order_id):
+        shard = self.shard_for_order(order_id)
+        with self._lock:
+            expires = self._recent_writes.get(order_id)
+        if expires is not None and expires > time.monotonic():
+            return shard.primary
+        return shard.reader()
+
+    def reader_for_listing(self, shard):
+        """Order lijst van een shard: van de primary als dit proces er net een order schreef"""
+        with self._lock:
+            expires = self._shard_writes.get(shard.index)
+        if expires is not None and expires > time.monotonic():
+            return shard.primary
+        return shard.reader()
+
+
+class ShardMappingError(RuntimeError):
+    """Bestaande orders op een shard passen niet bij de (id - 1) % N routing"""
+
+
+def check_order_ids(cur, shard_index, shard_count):
+    """Weiger een shard met orders die volgens de routing op een andere shard horen"""
+    cur.execute(
+        "SELECT COUNT(*), MIN(id) FROM orders WHERE (id - 1) %% %s <> %s",
+        (shard_count, shard_index)
+    )
+    misplaced, example = cur.fetchone()
+    if misplaced:
+        raise ShardMappingError(
+            f"Shard {shard_index} of {shard_count} contains {misplaced} orders that route to another "
+            f"shard (e.g. id {example}); move them to their shard before starting with DB_SHARDS"
+        )
+
+
+def configure_order_ids(cur, shard_index, shard_count):
+    """
+    Laat orders_id_seq op deze shard alleen ids uitgeven met (id - 1) % shard_count == shard_index
+    Wordt maar één keer gedaan; een al geconfigureerde sequence wordt niet teruggezet.
+    Geeft ShardMappingError als er al orders staan die volgens de routing elders horen.
+    """
+    if shard_count == 1:
+        return
+    check_order_ids(cur, shard_index, shard_count)
+    cur.execute("SELECT increment_by FROM pg_sequences WHERE sequencename = 'orders_id_seq'")
+    row = cur.fetchone()
+    if row and row[0] == shard_count:
+        return
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM orders")
+    max_id = cur.fetchone()[0]
+    next_id = max_id + 1 + (shard_index - max_id) % shard_count
+    cur.execute("ALTER SEQUENCE orders_id_seq INCREMENT BY %s", (shard_count,))
+    cur.execute("SELECT setval('orders_id_seq', %s, false)", (next_id,))
+
+
+def parse_hosts(spec, default_port):
+    """'host1:5432,host2' -> [('host1', '5432'), ('host2', default_port)]"""
+    hosts = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        hosts.append((host, port or default_port))
+    return hosts
+
+
+def build_router(base_config, shards_spec='', replicas_spec='', pool_min=1, pool_max=10,
+                 pool_timeout=1.0, pool_overflow=5, read_your_writes_window=5.0):
+    """
+    Bouw de router uit de configuratie
+    - shards_spec: shards gescheiden door ';', per shard 'primary,replica,...'
+      bijvoorbeeld 'pg0:5432,pg0-replica:5432;pg1:5432'
+    - zonder shards_spec: één shard op base_config met replicas_spec als read replicas
+    """
+    def node(host, port):
+        return DbNode({**base_config, 'host': host, 'port': port}, pool_min, pool_max, pool_timeout, pool_overflow)
+
+    if shards_spec.strip():
+        shards = []
+        for index, shard_spec in enumerate(s for s in shards_spec.split(';') if s.strip()):
+            hosts = parse_hosts(shard_spec, base_config['port'])
+            shards.append(Shard(index, node(*hosts[0]), [node(*h) for h in hosts[1:]]))
+    else:
+        replicas = [node(*h) for h in parse_hosts(replicas_spec, base_config['port'])]
+        shards = [Shard(0, DbNode(base_config, pool_min, pool_max, pool_timeout, pool_overflow), replicas)]
+
+    return DbRouter(shards, read_your_writes_window)
+
+
+def config_from_env():
+    """Basis database configuratie uit de DB_* environment variabelen"""
+    return {
+        'host': os.getenv('DB_HOST', 'postgres'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'database': os.getenv('DB_NAME', 'orders'),
+        'user': os.getenv('DB_USER', 'admin'),
+        'password': os.getenv('DB_PASSWORD', 'password123')
+    }
+
+
+def router_from_env(cursor_factory=None):
+    """
+    Router uit de environment, gedeeld door de service en de export CLI
+    - DB_SHARDS / DB_REPLICA_HOSTS: zie build_router (leeg = één database op DB_HOST)
+    - DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT / DB_POOL_OVERFLOW: connection pool per node
+    - READ_YOUR_WRITES_WINDOW: seconden dat een net geschreven order van de primary komt
+    """
+    config = config_from_env()
+    if cursor_factory is not None:
+        config['cursor_factory'] = cursor_factory
+    return build_router(
+        config,
+        shards_spec=os.getenv('DB_SHARDS', ''),
+        replicas_spec=os.getenv('DB_REPLICA_HOSTS', ''),
+        pool_min=int(os.getenv('DB_POOL_MIN', '1')),
+        pool_max=int(os.getenv('DB_POOL_MAX', '10')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '1')),
+        pool_overflow=int(os.getenv('DB_POOL_OVERFLOW', '5')),
+        read_your_writes_window=float(os.getenv('READ_YOUR_WRITES_WINDOW', '5'))
+    )
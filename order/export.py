@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Order export - kolomgebaseerde export van de orders tabel voor analytics
+Streamt de tabel via een server-side cursor in begrensde chunks naar Parquet
+of een Arrow IPC stream, zodat bulk exports niet via het JSON pad van GET /orders gaan.
+"""
+import argparse
+import sys
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+FORMATS = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+COMPRESSIONS = ['zstd', 'snappy', 'gzip', 'none']
+
+ORDER_SCHEMA = pa.schema([
+    ('id', pa.int32()),
+    ('customer_name', pa.string()),
+    ('product', pa.string()),
+    ('amount', pa.decimal128(10, 2)),
+    ('status', pa.string()),
+    ('payment_status', pa.string()),
+    ('created_at', pa.timestamp('us')),
+])
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class _ChunkSink:
+    """Write-only bestand dat geschreven bytes bufferd tot ze opgehaald worden"""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parse_timestamp(value):
+    """ISO 8601 timestamp of None"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def iter_order_batches(conn, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Lees orders met een server-side cursor en lever RecordBatches van max chunk_size rijen"""
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("created_at < %s")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Named cursor = server-side cursor, rijen komen per itersize binnen
+    cur = conn.cursor(name='orders_export')
+    cur.itersize = chunk_size
+    try:
+        cur.execute(
+            f"""
+            SELECT id, customer_name, product, amount, status, payment_status, created_at
+            FROM orders {where} ORDER BY created_at, id
+            """,
+            params
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, ORDER_SCHEMA)],
+                schema=ORDER_SCHEMA
+            )
+    finally:
+        cur.close()
+
+
+def iter_sharded_batches(conns, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """RecordBatches van alle shards na elkaar; binnen een shard gesorteerd op created_at"""
+    for conn in conns:
+        yield from iter_order_batches(conn, since=since, until=until, chunk_size=chunk_size)
+
+
+def stream_export(batches, fmt='parquet', compression='zstd'):
+    """Encodeer RecordBatches als Parquet of Arrow IPC stream, yield bytes per chunk"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    codec = None if compression == 'none' else compression
+
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, ORDER_SCHEMA, compression=codec or 'none')
+        write = writer.write_batch
+    else:
+        if codec not in (None, 'zstd'):
+            # Arrow IPC buffers ondersteunen alleen lz4_frame en zstd
+            raise ValueError(f"Unsupported compression for arrow: {compression}")
+        writer = pa.ipc.new_stream(sink, ORDER_SCHEMA, options=pa.ipc.IpcWriteOptions(compression=codec))
+        write = writer.write_batch
+
+    for batch in batches:
+        write(batch)
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def main():
+    # Alleen de routing, niet app: die start health checks, listeners en group writers
+    from db_router import router_from_env
+
+    parser = argparse.ArgumentParser(description='Export orders naar Parquet of Arrow IPC')
+    parser.add_argument('--output', required=True, help='Output bestand, - voor stdout')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet', help='Output formaat')
+    parser.add_argument('--compression', choices=COMPRESSIONS, default='zstd', help='Compressie codec')
+    parser.add_argument('--since', help='Alleen orders vanaf deze ISO timestamp')
+    parser.add_argument('--until', help='Alleen orders tot deze ISO timestamp')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rijen per chunk')
+
+    args = parser.parse_args()
+
+    # Alle shards (DB_SHARDS), elk gelezen van een replica indien aanwezig
+    conns = []
+    try:
+        for shard in router_from_env().shards:
+            conns.append(shard.reader().connect())
+        batches = iter_sharded_batches(
+            conns,
+            since=parse_timestamp(args.since),
+            until=parse_timestamp(args.until),
+            chunk_size=args.chunk_size
+        )
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            for data in stream_export(batches, args.format, args.compression):
+                out.write(data)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Group commit writer voor de order service
+Verzamelt gelijktijdige order inserts en status updates van request threads in
+korte micro-batches, zodat Postgres per batch maar één WAL flush hoeft te doen.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import psycopg2
+from psycopg2.extras import execute_values
+from prometheus_client import Histogram
+
+
+flush_size = Histogram(
+    'order_group_commit_flush_size',
+    'Number of statements per group commit flush',
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200]
+)
+flush_latency = Histogram(
+    'order_group_commit_flush_latency_seconds',
+    'Time spent executing and committing a group commit flush',
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5]
+)
+
+# Fouten door de data van een item (niet door de connectie): per item opnieuw proberen
+RETRYABLE_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+_INSERT = 'insert'
+_UPDATE = 'update'
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Achtergrond writer: request threads krijgen een Future terug die wordt
+    opgelost met het order_id zodra hun batch gecommit is.
+    Een batch wordt geflusht zodra max_batch_size bereikt is of max_delay
+    seconden na het eerste item in de batch. Faalt een batch door een data fout, dan
+    wordt elk item los opnieuw geprobeerd, zodat alleen de foute items een exception
+    krijgen; bij een connectie fout faalt de hele batch (hij kan al gecommit zijn).
+    """
+
+    def __init__(self, connect, max_batch_size=50, max_delay=0.005):
+        self._connect = connect
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self._thread.start()
+
+    def insert_order(self, customer_name, product, amount, status='pending', payment_status='pending'):
+        """Plan een order insert in, Future levert het nieuwe order_id op"""
+        return self._submit(_INSERT, (customer_name, product, amount, status, payment_status))
+
+    def update_status(self, order_id, status, payment_status):
+        """Plan een status update in, Future levert het order_id op"""
+        return self._submit(_UPDATE, (order_id, status, payment_status))
+
+    def close(self, timeout=5):
+        """Flush openstaande items en stop de writer thread"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _submit(self, kind, params):
+        future = Future()
+        self._queue.put((kind, params, future))
+        return future
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self._execute(batch)
+        except RETRYABLE_ERRORS as e:
+            # Eén foute rij mag de rest van de batch niet meenemen: items los opnieuw proberen
+            print(f"Group commit error, retrying {len(batch)} items one by one: {e}")
+            self._reset()
+            self._flush_each(batch)
+            return
+        except Exception as e:
+            # Connectie fout: de batch kan al gecommit zijn, opnieuw proberen kan dubbele orders geven
+            self._fail(batch, e)
+            return
+
+        flush_latency.observe(time.perf_counter() - start)
+        flush_size.observe(len(batch))
+
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _flush_each(self, batch):
+        for position, item in enumerate(batch):
+            try:
+                result, = self._execute([item])
+            except RETRYABLE_ERRORS as e:
+                self._reset()
+                item[2].set_exception(e)
+                continue
+            except Exception as e:
+                self._fail(batch[position:], e)
+                return
+            flush_size.observe(1)
+            item[2].set_result(result)
+
+    def _fail(self, batch, error):
+        print(f"Group commit error, failing {len(batch)} items: {error}")
+        self._close()
+        for _, _, future in batch:
+            future.set_exception(error)
+
+    def _execute(self, batch):
+        """Voer een batch uit in één transactie, geeft per item het order_id terug (zelfde volgorde)"""
+        inserts = [params for kind, params, _ in batch if kind == _INSERT]
+        updates = [params for kind, params, _ in batch if kind == _UPDATE]
+
+        if self._conn is None:
+            self._conn = self._connect()
+        cur = self._conn.cursor()
+        try:
+            new_ids = []
+            if inserts:
+                # Ids vooraf uit de sequence halen en expliciet meegeven:
+                # de volgorde van multi-row RETURNING is niet gegarandeerd
+                cur.execute("SELECT nextval('orders_id_seq') FROM generate_series(1, %s)", (len(inserts),))
+                new_ids = [row[0] for row in cur.fetchall()]
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO orders (id, customer_name, product, amount, status, payment_status)
+                    VALUES %s
+                    """,
+                    [(order_id, *params) for order_id, params in zip(new_ids, inserts)],
+                    page_size=len(inserts)
+                )
+
+            if updates:
+                execute_values(
+                    cur,
+                    """
+                    UPDATE orders SET status = v.status, payment_status = v.payment_status
+                    FROM (VALUES %s) AS v (id, status, payment_status)
+                    WHERE orders.id = v.id
+                    """,
+                    updates,
+                    template='(%s::integer, %s, %s)',
+                    page_size=len(updates)
+                )
+
+            self._conn.commit()
+        finally:
+            cur.close()
+
+        ids = iter(new_ids)
+        return [next(ids) if kind == _INSERT else params[0] for kind, params, _ in batch]
+
+    def _reset(self):
+        """Rollback na een data fout; lukt dat niet, dan wordt de connectie gesloten"""
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+        except Exception:
+            self._close()
+
+    def _close(self):
+        """Sluit de connectie, de volgende flush verbindt opnieuw"""
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
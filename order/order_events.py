@@ -0,0 +1,148 @@
+"""
+Order status events
+In-process publish/subscribe voor status wijzigingen van orders, optioneel gevoed
+door Postgres LISTEN/NOTIFY zodat het ook over replicas heen werkt.
+"""
+import json
+import select
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+
+event_subscribers = Gauge(
+    'order_event_subscribers',
+    'Number of clients waiting for an order status event'
+)
+events_published = Counter(
+    'order_events_published_total',
+    'Order status events delivered to the hub',
+    ['source']
+)
+
+NOTIFY_CHANNEL = 'order_status'
+
+# Trigger die bij elke payment_status wijziging een NOTIFY stuurt, ongeacht welk write pad
+NOTIFY_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION notify_order_status() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object(
+            'id', NEW.id, 'status', NEW.status, 'payment_status', NEW.payment_status
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER orders_status_notify
+        AFTER UPDATE OF status, payment_status ON orders
+        FOR EACH ROW
+        WHEN (OLD.payment_status IS DISTINCT FROM NEW.payment_status)
+        EXECUTE FUNCTION notify_order_status();
+"""
+
+
+class Subscription:
+    """Wacht op de eerstvolgende status event van één order"""
+
+    def __init__(self, hub, order_id):
+        self._hub = hub
+        self.order_id = order_id
+        self._ready = threading.Event()
+        self.event = None
+
+    def deliver(self, event):
+        self.event = event
+        self._ready.set()
+
+    def wait(self, timeout):
+        """Geeft de event dict terug, of None bij timeout"""
+        self._ready.wait(timeout)
+        return self.event
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OrderEventHub:
+    """Verdeelt status events over de subscriptions per order_id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, order_id):
+        sub = Subscription(self, order_id)
+        with self._lock:
+            self._subscribers.setdefault(order_id, set()).add(sub)
+        event_subscribers.inc()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.order_id)
+            if subs is None or sub not in subs:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.order_id]
+        event_subscribers.dec()
+
+    def publish(self, order_id, status, payment_status, source='local'):
+        events_published.labels(source=source).inc()
+        event = {"id": order_id, "status": status, "payment_status": payment_status}
+        with self._lock:
+            subs = list(self._subscribers.get(order_id, ()))
+        for sub in subs:
+            sub.deliver(event)
+
+
+class PgNotifyListener:
+    """
+    Achtergrond thread met één LISTEN connectie die NOTIFY payloads doorgeeft aan de hub
+    Bij connectie fouten wordt na retry_interval seconden opnieuw verbonden.
+    """
+
+    def __init__(self, connect, hub, channel=NOTIFY_CHANNEL, retry_interval=5):
+        self._connect = connect
+        self._hub = hub
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._thread = threading.Thread(target=self._run, name='order-event-listener', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([conn], [], [], self.retry_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Order event listener error: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(self.retry_interval)
+
+    def _dispatch(self, payload):
+        try:
+            data = json.loads(payload)
+            self._hub.publish(data['id'], data['status'], data['payment_status'], source='notify')
+        except (ValueError, KeyError) as e:
+            print(f"Invalid order event payload: {e}")
@@ -2,8 +2,12 @@
 Payment Service - Simuleerd payment processing
 Demonstreert externe API calls en distributed tracing
 """
+import os
+
 # Added for Instana because no (full) auto-discovery for this application or related services
-import instana
+# INSTANA_ENABLED=false schakelt Instana uit, bijvoorbeeld bij gebruik van de ingebouwde tracing
+if os.getenv('INSTANA_ENABLED', 'true').lower() == 'true':
+    import instana
 
 from flask import Flask, request, jsonify
 import time
@@ -12,7 +16,18 @@ import requests
 from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
 from prometheus_flask_exporter import PrometheusMetrics
 
+from fastjson import OrjsonProvider
+from ledger import PaymentLedger
+import tracing
+import deadline
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+tracer = tracing.init_app(app, 'payment-service')
+
+# Deadline van de caller (X-Request-Deadline-Ms) afdwingen
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '10'))
+deadline.init_app(app, REQUEST_DEADLINE)
 metrics = PrometheusMetrics(app)
 
 # Prometheus metrics
@@ -32,6 +47,16 @@ external_api_calls = Counter(
     ['gateway', 'status']
 )
 
+# Payment ledger: append-only log met index, wordt bij opstarten opnieuw afgespeeld
+LEDGER_PATH = os.getenv('LEDGER_PATH', 'data/payments.ledger')
+LEDGER_FSYNC = os.getenv('LEDGER_FSYNC', 'true').lower() == 'true'
+LEDGER_COMPACT_INTERVAL = float(os.getenv('LEDGER_COMPACT_INTERVAL', '300'))
+# Compacteren zodra zoveel records door een nieuwer record vervangen zijn
+LEDGER_COMPACT_MIN_GARBAGE = int(os.getenv('LEDGER_COMPACT_MIN_GARBAGE', '10000'))
+
+ledger = PaymentLedger(LEDGER_PATH, fsync=LEDGER_FSYNC)
+ledger.start_compaction(interval=LEDGER_COMPACT_INTERVAL, min_garbage=LEDGER_COMPACT_MIN_GARBAGE)
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "healthy", "service": "payment-service"}), 200
@@ -54,6 +79,14 @@ def process_payment():
             payment_counter.labels(status='invalid').inc()
             return jsonify({"error": "Missing required fields"}), 400
         
+        # Leg de payment eerst vast als pending, zodat hij een crash overleeft
+        transaction_id = ledger.next_transaction_id()
+        payment = {
+            "amount": data['amount'],
+            "customer": data.get('customer')
+        }
+        ledger.record(transaction_id, data['order_id'], 'pending', **payment)
+        
         # Simuleer payment processing tijd (variabel)
         processing_time = random.uniform(0.1, 0.8)
         time.sleep(processing_time)
@@ -65,16 +98,19 @@ def process_payment():
         # Simuleer failures (15% van de tijd)
         if random.random() < 0.15 or not gateway_success:
             payment_counter.labels(status='failed').inc()
+            ledger.record(transaction_id, data['order_id'], 'failed', **payment)
             duration = time.time() - start_time
             payment_duration.observe(duration)
             return jsonify({
                 "status": "failed",
                 "order_id": data['order_id'],
+                "transaction_id": transaction_id,
                 "reason": "Payment gateway declined",
                 "processing_time": duration
             }), 402
         
         # Success
+        ledger.record(transaction_id, data['order_id'], 'completed', **payment)
         duration = time.time() - start_time
         payment_duration.observe(duration)
         payment_counter.labels(status='success').inc()
@@ -82,7 +118,7 @@ def process_payment():
         return jsonify({
             "status": "completed",
             "order_id": data['order_id'],
-            "transaction_id": f"TXN-{random.randint(100000, 999999)}",
+            "transaction_id": transaction_id,
             "processing_time": duration
         }), 200
         
@@ -117,14 +153,23 @@ def simulate_external_gateway(amount):
 
 @app.route('/payments/<string:transaction_id>', methods=['GET'])
 def get_payment_status(transaction_id):
-    """Check payment status"""
-    # Simuleer lookup
-    time.sleep(random.uniform(0.05, 0.15))
+    """Check payment status - O(1) lookup in de ledger index"""
+    payment = ledger.get(transaction_id)
+    
+    if payment is None:
+        return jsonify({"error": "Payment not found"}), 404
+    
+    return jsonify(payment), 200
+
+@app.route('/payments/order/<string:order_id>', methods=['GET'])
+def get_order_payment_status(order_id):
+    """Check status van de laatste payment voor een order"""
+    payment = ledger.get_by_order(order_id)
+    
+    if payment is None:
+        return jsonify({"error": "Payment not found"}), 404
     
-    return jsonify({
-        "transaction_id": transaction_id,
-        "status": "completed"
-    }), 200
+    return jsonify(payment), 200
 
 @app.route('/metrics', methods=['GET'])
 def metrics_endpoint():
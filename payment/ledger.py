@@ -0,0 +1,304 @@
+"""
+Payment Ledger - duurzaam, append-only logboek van payments
+Elke status wijziging is één JSON regel in het log bestand. Een in-memory index
+van transaction_id en order_id naar de offset van het laatste record maakt
+status lookups O(1); bij opstarten wordt het log opnieuw afgespeeld.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+
+import orjson
+from prometheus_client import Counter, Gauge
+
+
+ledger_records = Gauge(
+    'payment_ledger_records',
+    'Records in the payment ledger log',
+    ['kind']
+)
+ledger_compactions = Counter(
+    'payment_ledger_compactions_total',
+    'Payment ledger compactions'
+)
+
+
+def node_id():
+    """Korte, stabiele id van deze instance voor unieke transaction ids over replicas"""
+    name = os.getenv('LEDGER_NODE_ID') or socket.gethostname()
+    return hashlib.sha1(name.encode()).hexdigest()[:6].upper()
+
+
+class _LogFile:
+    """
+    Open log bestand met zijn index; compact() vervangt het geheel in één keer
+    Readers houden een referentie vast (acquire/release); een vervangen log wordt pas
+    gesloten als de laatste reader klaar is.
+    """
+
+    def __init__(self, fd=None):
+        self.fd = fd
+        self.by_txn = {}
+        self.by_order = {}
+        self._users = 0
+        self._retired = False
+        self._closed = False
+        self._ref_lock = threading.Lock()
+
+    def acquire(self):
+        """False als dit log al gesloten is; pak dan het huidige log opnieuw"""
+        with self._ref_lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._ref_lock:
+            self._users -= 1
+            close = self._retired and self._users == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            os.close(self.fd)
+
+    def retire(self):
+        with self._ref_lock:
+            self._retired = True
+            close = self._users == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            os.close(self.fd)
+
+    def read_line(self, offset):
+        chunk = b''
+        while not chunk.endswith(b'\n'):
+            data = os.pread(self.fd, 4096, offset + len(chunk))
+            if not data:
+                break
+            chunk += data
+            if b'\n' in data:
+                chunk = chunk[:chunk.index(b'\n') + 1]
+        return chunk
+
+    def read(self, offset):
+        return orjson.loads(self.read_line(offset))
+
+
+class PaymentLedger:
+    """
+    Append-only payment log met index
+    - record(...) schrijft een nieuw record en werkt de index bij; de fsync gebeurt buiten de lock
+    - get(transaction_id) / get_by_order(order_id) lezen het laatste record via de offset,
+      zonder de writer lock: ze pakken een referentie naar de huidige _LogFile en lezen met pread
+    - compact() herschrijft het log met alleen het laatste record per transactie; het oude
+      log wordt gesloten zodra de laatste reader ervan klaar is
+    """
+
+    def __init__(self, path, fsync=True, node=None):
+        self.path = path
+        self.fsync = fsync
+        self.node = node or node_id()
+        self._lock = threading.Lock()
+        self._log = _LogFile()
+        self._records = 0
+        self._corrupt = 0
+        self._seq = 0
+        self._compact_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._replay()
+        self._log.fd = self._open()
+        self._update_gauges()
+
+    def next_transaction_id(self):
+        """Collision-vrije transaction id: node prefix + oplopend volgnummer"""
+        with self._lock:
+            self._seq += 1
+            return f"TXN-{self.node}-{self._seq:010d}"
+
+    def record(self, transaction_id, order_id, status, **fields):
+        """Voeg een status record toe voor een transactie"""
+        entry = {
+            "transaction_id": transaction_id,
+            "order_id": order_id,
+            "status": status,
+            "timestamp": time.time(),
+            **fields
+        }
+        line = orjson.dumps(entry) + b'\n'
+        with self._lock:
+            log = self._log
+            log.acquire()
+            offset = os.lseek(log.fd, 0, os.SEEK_END)
+            os.write(log.fd, line)
+            self._index(entry, offset)
+            self._records += 1
+        try:
+            # Buiten de lock: lookups en andere writes wachten niet op de disk; gelijktijdige
+            # fsyncs worden door het filesysteem samengenomen
+            if self.fsync:
+                os.fsync(log.fd)
+        finally:
+            log.release()
+        self._update_gauges()
+        return entry
+
+    def get(self, transaction_id):
+        """Laatste record van een transactie, of None"""
+        log = self._current()
+        try:
+            offset = log.by_txn.get(transaction_id)
+            return None if offset is None else log.read(offset)
+        finally:
+            log.release()
+
+    def get_by_order(self, order_id):
+        """Laatste record van de laatste transactie voor een order, of None"""
+        log = self._current()
+        try:
+            transaction_id = log.by_order.get(str(order_id))
+            if transaction_id is None:
+                return None
+            return log.read(log.by_txn[transaction_id])
+        finally:
+            log.release()
+
+    def garbage_records(self):
+        """Aantal records dat door een nieuwer record van dezelfde transactie vervangen is"""
+        with self._lock:
+            return self._records - len(self._log.by_txn)
+
+    def compact(self):
+        """
+        Herschrijf het log met alleen het laatste record per transactie (atomair via rename)
+        Het kopiëren gebeurt zonder lock; alleen het bijschrijven van de records die
+        tijdens het kopiëren zijn toegevoegd en de wissel van bestand gebeuren onder de lock.
+        """
+        tmp_path = self.path + '.compact'
+        with self._compact_lock:
+            with self._lock:
+                old = self._log
+                offsets = sorted(old.by_txn.values())
+                snapshot_end = os.lseek(old.fd, 0, os.SEEK_END)
+
+            # Records voor snapshot_end veranderen niet meer (append-only)
+            new = _LogFile()
+            records = 0
+            with open(tmp_path, 'wb') as out:
+                for offset in offsets:
+                    self._copy(old.read_line(offset), out, new)
+                    records += 1
+                out.flush()
+                os.fsync(out.fileno())
+
+                with self._lock:
+                    # Records die tijdens het kopiëren zijn geschreven overnemen
+                    tail = os.pread(old.fd, os.lseek(old.fd, 0, os.SEEK_END) - snapshot_end, snapshot_end)
+                    for line in tail.splitlines(keepends=True):
+                        self._copy(line, out, new)
+                        records += 1
+                    out.flush()
+                    os.fsync(out.fileno())
+                    os.replace(tmp_path, self.path)
+                    new.fd = self._open()
+                    self._log = new
+                    self._records = records
+
+            # Het oude log blijft open tot reads (en fsyncs) die het nog gebruiken klaar zijn
+            old.retire()
+        ledger_compactions.inc()
+        self._update_gauges()
+
+    def start_compaction(self, interval=300, min_garbage=10000):
+        """
+        Achtergrond thread die compacteert zodra er min_garbage vervangen records zijn
+        Elke payment schrijft een pending en een eind record, dus de garbage groeit
+        met ongeveer één record per payment.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.garbage_records() >= min_garbage:
+                        self.compact()
+                except Exception as e:
+                    print(f"Ledger compaction error: {e}")
+
+        thread = threading.Thread(target=run, name='ledger-compaction', daemon=True)
+        thread.start()
+        return thread
+
+    def _current(self):
+        while True:
+            log = self._log
+            if log.acquire():
+                return log
+
+    def _open(self):
+        return os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+
+    @staticmethod
+    def _copy(line, out, log):
+        entry = orjson.loads(line)
+        log.by_txn[entry['transaction_id']] = out.tell()
+        log.by_order[str(entry['order_id'])] = entry['transaction_id']
+        out.write(line)
+
+    def _index(self, entry, offset):
+        # by_txn voor by_order: een lock-vrije reader vindt via by_order altijd een offset
+        transaction_id = entry['transaction_id']
+        self._log.by_txn[transaction_id] = offset
+        self._log.by_order[str(entry['order_id'])] = transaction_id
+        prefix = f"TXN-{self.node}-"
+        if transaction_id.startswith(prefix):
+            self._seq = max(self._seq, int(transaction_id[len(prefix):]))
+
+    @staticmethod
+    def _decode(line):
+        """Record uit een log regel, of None als de regel onvolledig of corrupt is"""
+        if not line.endswith(b'\n'):
+            return None
+        try:
+            entry = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            return None
+        if not isinstance(entry, dict) or 'transaction_id' not in entry or 'order_id' not in entry:
+            return None
+        return entry
+
+    def _replay(self):
+        """
+        Bouw de index op uit het log
+        Alleen een onleesbare laatste regel is een half geschreven record en wordt afgekapt;
+        onleesbare regels midden in het log worden overgeslagen, geteld en gelogd.
+        """
+        if not os.path.exists(self.path):
+            return
+        tail = None
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if tail is not None:
+                    # Er volgt nog een regel, dus de vorige onleesbare regel was geen torn tail
+                    self._corrupt += 1
+                    tail = None
+                entry = self._decode(line)
+                if entry is None:
+                    tail = offset
+                else:
+                    self._index(entry, offset)
+                    self._records += 1
+                offset += len(line)
+        if self._corrupt:
+            print(f"Ledger: skipped {self._corrupt} corrupt records in {self.path}")
+        if tail is not None:
+            print(f"Ledger: truncating torn tail at offset {tail}")
+            os.truncate(self.path, tail)
+
+    def _update_gauges(self):
+        ledger_records.labels(kind='total').set(self._records)
+        ledger_records.labels(kind='live').set(len(self._log.by_txn))
+        ledger_records.labels(kind='corrupt').set(self._corrupt)
@@ -0,0 +1,343 @@
+"""
+Ingebouwde tracing met W3C trace-context propagatie
+- Server spans voor Flask requests, client spans voor psycopg2 queries en uitgaande requests calls
+- Head sampling (TRACE_SAMPLE_RATE, parent-based) en optionele tail sampling: segmenten die niet
+  head-sampled zijn worden toch bewaard als ze traag (TRACE_TAIL_LATENCY_MS) of mislukt zijn
+- Afgeronde spans gaan in een ring buffer; een achtergrond thread exporteert ze in batches naar
+  een collector endpoint (JSON lines over HTTP) of een bestand, nooit op de request thread
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import orjson
+from prometheus_client import Counter
+
+
+spans_exported = Counter(
+    'tracing_spans_exported_total',
+    'Spans written by the tracing exporter'
+)
+spans_dropped = Counter(
+    'tracing_spans_dropped_total',
+    'Spans dropped because the export buffer was full or the export failed'
+)
+trace_decisions = Counter(
+    'tracing_trace_decisions_total',
+    'Sampling decisions for local trace segments',
+    ['decision']
+)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def parse_traceparent(header):
+    """'00-<trace_id>-<parent_id>-<flags>' -> (trace_id, parent_id, sampled) of None"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class _Segment:
+    """Het deel van een trace dat in dit proces draait"""
+
+    __slots__ = ('trace_id', 'sampled', 'recording', 'spans')
+
+    def __init__(self, trace_id, sampled, recording):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.recording = recording
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('segment', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, segment, parent_id, name, kind, attributes=None):
+        self.segment = segment
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = False
+
+    def set_attribute(self, key, value):
+        if self.segment.recording:
+            self.attributes[key] = value
+
+    def traceparent(self):
+        flags = '01' if self.segment.sampled else '00'
+        return f"00-{self.segment.trace_id}-{self.span_id}-{flags}"
+
+    def to_dict(self, service):
+        return {
+            "trace_id": self.segment.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": service,
+            "name": self.name,
+            "kind": self.kind,
+            "start_us": self.start // 1000,
+            "duration_us": (self.end - self.start) // 1000,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class BatchExporter:
+    """Ring buffer van afgeronde spans, geleegd door een achtergrond thread"""
+
+    def __init__(self, service, endpoint=None, path=None, buffer_size=2048, batch_size=256, interval=1.0):
+        self.service = service
+        self.endpoint = endpoint
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, spans):
+        for span in spans:
+            if len(self._buffer) == self._buffer.maxlen:
+                spans_dropped.inc()
+            self._buffer.append(span)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < self.batch_size:
+                batch.append(self._buffer.popleft())
+            self._write(batch)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Trace exporter error: {e}")
+
+    def _write(self, batch):
+        payload = b''.join(orjson.dumps(span.to_dict(self.service)) + b'\n' for span in batch)
+        try:
+            if self.endpoint:
+                import requests
+                response = requests.post(
+                    self.endpoint,
+                    data=payload,
+                    headers={'Content-Type': 'application/x-ndjson'},
+                    timeout=5
+                )
+                # Een 4xx/5xx van de collector is geen export: spans tellen als dropped
+                response.raise_for_status()
+            if self.path:
+                with open(self.path, 'ab') as f:
+                    f.write(payload)
+            spans_exported.inc(len(batch))
+        except Exception:
+            spans_dropped.inc(len(batch))
+            raise
+
+
+class Tracer:
+    def __init__(self, exporter, sample_rate=0.1, tail_latency_ms=0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.tail_latency_ns = int(tail_latency_ms * 1_000_000)
+
+    def start_root(self, name, kind='server', traceparent=None, attributes=None):
+        """Start een lokale root span, als vervolg op de binnenkomende trace indien aanwezig"""
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < self.sample_rate
+        # Tail sampling moet elk segment opnemen om achteraf te kunnen beslissen
+        recording = sampled or self.tail_latency_ns > 0
+        segment = _Segment(trace_id, sampled, recording)
+        return Span(segment, parent_id, name, kind, attributes if recording else None)
+
+    def start_child(self, parent, name, kind='internal', attributes=None):
+        recording = parent.segment.recording
+        return Span(parent.segment, parent.span_id, name, kind, attributes if recording else None)
+
+    def finish(self, span, root=False):
+        span.end = time.time_ns()
+        segment = span.segment
+        if not segment.recording:
+            if root:
+                trace_decisions.labels(decision='dropped').inc()
+            return
+        segment.spans.append(span)
+        if not root:
+            return
+
+        if segment.sampled:
+            decision = 'head'
+        elif any(s.error for s in segment.spans) or span.end - span.start >= self.tail_latency_ns:
+            decision = 'tail'
+        else:
+            decision = 'dropped'
+        trace_decisions.labels(decision=decision).inc()
+        if decision != 'dropped':
+            self.exporter.export(segment.spans)
+
+    @contextmanager
+    def span(self, name, kind='internal', attributes=None):
+        """Child span van de huidige span; doet niets buiten een getracede request"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = self.start_child(parent, name, kind, attributes)
+        _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = True
+            span.set_attribute('exception', f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.set(parent)
+            self.finish(span)
+
+
+def instrument_flask(app, tracer):
+    """Server span per request, als vervolg op een binnenkomende traceparent header"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        environ = request.environ
+        rule = request.url_rule.rule if request.url_rule else environ.get('PATH_INFO', '')
+        span = tracer.start_root(f"{request.method} {rule}", traceparent=environ.get('HTTP_TRACEPARENT'))
+        if span.segment.recording:
+            # Attributes alleen opbouwen voor segmenten die geëxporteerd kunnen worden
+            query = environ.get('QUERY_STRING')
+            target = environ.get('PATH_INFO', '') + (f"?{query}" if query else '')
+            span.attributes.update({"http.method": request.method, "http.target": target})
+        g._trace_span = span
+        g._trace_parent = _current_span.get()
+        _current_span.set(span)
+
+    @app.after_request
+    def _response_status(response):
+        span = g.get('_trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            span.error = response.status_code >= 500
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        span = g.pop('_trace_span', None)
+        if span is None:
+            return
+        if exc is not None:
+            span.error = True
+            span.set_attribute('exception', f"{type(exc).__name__}: {exc}")
+        _current_span.set(g.pop('_trace_parent', None))
+        tracer.finish(span, root=True)
+
+
+def instrument_requests(tracer):
+    """Client span en traceparent header voor elke uitgaande requests call binnen een trace"""
+    import requests
+
+    if getattr(requests.Session.send, '_traced', False):
+        return
+    original_send = requests.Session.send
+
+    def send(self, prepared, **kwargs):
+        if _current_span.get() is None:
+            return original_send(self, prepared, **kwargs)
+        with tracer.span(
+            f"{prepared.method} {urlsplit(prepared.url).netloc}",
+            kind='client',
+            attributes={"http.method": prepared.method, "http.url": prepared.url}
+        ) as span:
+            prepared.headers['traceparent'] = span.traceparent()
+            response = original_send(self, prepared, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            span.error = response.status_code >= 500
+            return response
+
+    send._traced = True
+    requests.Session.send = send
+
+
+def traced_cursor_factory(tracer):
+    """psycopg2 cursor class met een client span per execute(), voor connect(cursor_factory=...)"""
+    import psycopg2.extensions
+
+    class TracedCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            if _current_span.get() is None:
+                return super().execute(query, vars)
+            statement = query.decode() if isinstance(query, bytes) else str(query)
+            statement = ' '.join(statement.split())
+            with tracer.span(
+                f"postgres {statement.split(' ', 1)[0].upper()}",
+                kind='client',
+                attributes={"db.system": "postgresql", "db.statement": statement[:500]}
+            ):
+                return super().execute(query, vars)
+
+    return TracedCursor
+
+
+def tracer_from_env(service):
+    """Tracer uit de TRACE_* environment variabelen, of None als TRACING_ENABLED niet true is"""
+    if os.getenv('TRACING_ENABLED', 'false').lower() != 'true':
+        return None
+    exporter = BatchExporter(
+        service,
+        endpoint=os.getenv('TRACE_EXPORT_ENDPOINT') or None,
+        path=os.getenv('TRACE_EXPORT_FILE') or None,
+        buffer_size=int(os.getenv('TRACE_BUFFER_SIZE', '2048')),
+        batch_size=int(os.getenv('TRACE_BATCH_SIZE', '256')),
+        interval=float(os.getenv('TRACE_FLUSH_INTERVAL', '1.0'))
+    )
+    return Tracer(
+        exporter,
+        sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+        tail_latency_ms=float(os.getenv('TRACE_TAIL_LATENCY_MS', '0'))
+    )
+
+
+def init_app(app, service):
+    """Zet tracing aan voor een Flask app en zijn uitgaande requests calls; geeft de tracer of None"""
+    tracer = tracer_from_env(service)
+    if tracer is not None:
+        instrument_flask(app, tracer)
+        instrument_requests(tracer)
+    return tracer
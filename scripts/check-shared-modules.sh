@@ -0,0 +1,41 @@
+#!/usr/bin/env bash
+#
+# Controleer dat de gedeelde modules in alle services identiek zijn
+#
+#   ./scripts/check-shared-modules.sh
+#
+# Elke service wordt los door S2I gebouwd vanuit zijn eigen directory, dus gedeelde
+# modules staan als kopie in elke service. Pas ze aan in één service, kopieer ze
+# naar de andere en draai dit script; bij verschillen is de exit code 1.
+#
+set -euo pipefail
+
+cd "$(dirname "$0")/.."
+
+# module: services met een kopie (de eerste is de referentie)
+SHARED=(
+    "fastjson.py:order payment frontend"
+    "tracing.py:order payment frontend"
+    "deadline.py:order payment frontend"
+    "health.py:order frontend"
+    "upstream.py:order frontend"
+)
+
+status=0
+for entry in "${SHARED[@]}"; do
+    module=${entry%%:*}
+    read -r -a services <<< "${entry#*:}"
+    reference="${services[0]}/$module"
+    for service in "${services[@]:1}"; do
+        if ! cmp -s "$reference" "$service/$module"; then
+            echo "✗ $service/$module differs from $reference"
+            diff -u "$reference" "$service/$module" || true
+            status=1
+        fi
+    done
+done
+
+if [ "$status" -eq 0 ]; then
+    echo "✓ Shared modules in sync"
+fi
+exit $status
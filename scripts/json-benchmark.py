@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+JSON Benchmark - serialisatie kosten per endpoint
+Vergelijkt Flask's standaard JSON provider (met de oude dict opbouw, float() en
+isoformat() per rij) met de orjson provider uit fastjson.py
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'order'))
+from fastjson import OrjsonProvider
+
+ORDER_COLUMNS = ('id', 'customer_name', 'product', 'amount', 'status', 'payment_status', 'created_at')
+
+CUSTOMERS = ["Jan de Vries", "Maria Jansen", "Peter van Dijk", "Anna Bakker"]
+PRODUCTS = ["MacBook Pro", "iPhone 15", "AirPods Pro", "iPad Air"]
+
+
+def make_rows(count):
+    """Rijen zoals psycopg2 ze teruggeeft voor SELECT * FROM orders"""
+    now = datetime.now()
+    return [
+        (
+            i,
+            random.choice(CUSTOMERS),
+            random.choice(PRODUCTS),
+            Decimal(f"{random.uniform(50.0, 2000.0):.2f}"),
+            'completed',
+            'completed',
+            now - timedelta(seconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_order(o):
+    return {
+        "id": o[0],
+        "customer_name": o[1],
+        "product": o[2],
+        "amount": float(o[3]),
+        "status": o[4],
+        "payment_status": o[5],
+        "created_at": o[6].isoformat() if o[6] else None
+    }
+
+
+def build_cases(rows):
+    """endpoint -> (oude payload functie, nieuwe payload functie)"""
+    return {
+        'GET /orders': (
+            lambda: {"orders": [legacy_order(o) for o in rows]},
+            lambda: {"orders": [dict(zip(ORDER_COLUMNS, o)) for o in rows]},
+        ),
+        'GET /orders/<id>': (
+            lambda: legacy_order(rows[0]),
+            lambda: dict(zip(ORDER_COLUMNS, rows[0])),
+        ),
+        'POST /orders': (
+            lambda: {"order_id": 42, "status": "completed", "payment_status": "completed", "processing_time": 0.4213},
+        ) * 2,
+        'POST /payments': (
+            lambda: {"status": "completed", "order_id": 42, "transaction_id": "TXN-123456", "processing_time": 0.3127},
+        ) * 2,
+    }
+
+
+def bench(app, payload, number):
+    with app.app_context():
+        return timeit.timeit(lambda: jsonify(payload()).get_data(), number=number) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON serialisatie benchmark per endpoint')
+    parser.add_argument('--rows', type=int, default=100, help='Aantal rijen voor GET /orders')
+    parser.add_argument('--number', type=int, default=2000, help='Iteraties per meting')
+    args = parser.parse_args()
+
+    default_app = Flask('default')
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask('orjson')
+    fast_app.json = OrjsonProvider(fast_app)
+
+    print(f"{'Endpoint':<20} {'default (us)':>14} {'orjson (us)':>14} {'speedup':>9}")
+    print("=" * 60)
+    for endpoint, (legacy, fast) in build_cases(make_rows(args.rows)).items():
+        before = bench(default_app, legacy, args.number) * 1e6
+        after = bench(fast_app, fast, args.number) * 1e6
+        print(f"{endpoint:<20} {before:>14.1f} {after:>14.1f} {before / after:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
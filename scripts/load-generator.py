@@ -8,6 +8,10 @@ import random
 import time
 import concurrent.futures
 import argparse
+import json
+import math
+import re
+import threading
 from datetime import datetime
 
 # Sample data voor realistische orders
@@ -21,6 +25,65 @@ PRODUCTS = [
     "Apple Watch", "Magic Keyboard", "Monitor", "Webcam"
 ]
 
+# Metrics die per stap van de services worden gescraped
+SCRAPED_METRICS = [
+    'active_orders',
+    'order_processing_duration_seconds_sum',
+    'order_processing_duration_seconds_count'
+]
+# Timeout per order request (seconden)
+REQUEST_TIMEOUT = 10
+
+METRIC_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)')
+
+def scrape_metrics(urls):
+    """Scrape /metrics van alle urls en tel de waarden per metric op (over replicas heen)"""
+    totals = {name: 0.0 for name in SCRAPED_METRICS}
+    for url in urls:
+        try:
+            response = requests.get(url, verify=False, timeout=5)
+        except Exception as e:
+            print(f"⚠️  Metrics scrape failed for {url}: {e}")
+            continue
+        for line in response.text.splitlines():
+            match = METRIC_LINE.match(line)
+            if match and match.group(1) in totals:
+                totals[match.group(1)] += float(match.group(3))
+    return totals
+
+class MetricsSampler:
+    """Scrape active_orders op een vast interval in een achtergrond thread, tijdens een stap"""
+    
+    def __init__(self, urls, interval=1.0):
+        self.urls = urls
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop met samplen, geeft de verzamelde active_orders waarden"""
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(scrape_metrics(self.urls)['active_orders'])
+            self._stop.wait(self.interval)
+
+def percentile(values, pct):
+    """Nearest-rank percentiel"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
 class LoadGenerator:
     def __init__(self, base_url, concurrency=5):
         self.base_url = base_url.rstrip('/')
@@ -34,6 +97,14 @@ class LoadGenerator:
     
     def create_order(self):
         """Creëer een enkele order"""
+        kind, result = self.send_order()
+        return kind == 'success', result
+    
+    def send_order(self):
+        """
+        Verstuur een order, geeft (kind, resultaat)
+        kind: success (201), failed (order/payment afgewezen) of error (geen antwoord, timeout, 502-504)
+        """
         order_data = {
             "customer_name": random.choice(CUSTOMERS),
             "product": random.choice(PRODUCTS),
@@ -46,21 +117,22 @@ class LoadGenerator:
                 headers={'Content-Type': 'application/json'},
                 json=order_data,
                 verify=False,
-                timeout=10
+                timeout=REQUEST_TIMEOUT
             )
             
             self.stats['total'] += 1
             
             if response.status_code == 201:
                 self.stats['success'] += 1
-                return True, response.json()
+                return 'success', response.json()
             else:
                 self.stats['failed'] += 1
-                return False, response.text
+                kind = 'error' if response.status_code in (502, 503, 504) else 'failed'
+                return kind, response.text
                 
         except Exception as e:
             self.stats['errors'] += 1
-            return False, str(e)
+            return 'error', str(e)
     
     def normal_load(self, duration_minutes=5, rate=5):
         """
@@ -135,6 +207,163 @@ class LoadGenerator:
         
         self.print_stats()
     
+    def timed_order(self, scheduled):
+        """
+        Creëer een order en meet latency vanaf het geplande verzendmoment; kind is success, failed of error
+        Wachttijd in de executor telt mee, anders verdwijnt juist de vertraging bij overbelasting
+        uit de meting (coordinated omission).
+        """
+        kind, _ = self.send_order()
+        return kind, time.time() - scheduled
+    
+    def run_step(self, rate, duration, executor):
+        """
+        Eén stap van de capacity test: open-loop load op een vaste rate
+        Requests worden op schema verstuurd, ongeacht hoe lang eerdere requests duren
+        """
+        futures = []
+        start = time.time()
+        for i in range(int(rate * duration)):
+            scheduled = start + i / rate
+            sleep_time = scheduled - time.time()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            futures.append(executor.submit(self.timed_order, scheduled))
+        
+        results = [future.result() for future in futures]
+        elapsed = max(time.time() - start, duration)
+        
+        latencies = [latency for kind, latency in results if kind != 'error']
+        errors = sum(1 for kind, _ in results if kind == 'error')
+        failed = sum(1 for kind, _ in results if kind == 'failed')
+        return {
+            "offered_rate": rate,
+            "requests": len(results),
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "error_rate": errors / max(len(results), 1),
+            "failure_rate": failed / max(len(results), 1),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p90": percentile(latencies, 90),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+        }
+    
+    def capacity_test(self, start_rate=2, max_rate=20, step=2, step_duration=60,
+                      slo_p99=2.0, max_error_rate=0.01, metrics_urls=(), metrics_interval=1.0,
+                      replicas=2, target_rate=None, report_path='capacity-report.json'):
+        """
+        Capacity analyse - step test met per stap throughput, latency percentielen en error rate
+        Bepaalt het saturatiepunt en de max rate die nog binnen de p99 SLO blijft
+        """
+        print(f"\n📐 CAPACITY TEST - {start_rate} → {max_rate} req/sec, stap {step}, {step_duration}s per stap")
+        print(f"   SLO: p99 <= {slo_p99}s, error rate <= {max_error_rate * 100:.1f}%")
+        print("=" * 60)
+        
+        steps = []
+        rate = start_rate
+        # Open-loop: genoeg workers voor max_rate requests die elk tot REQUEST_TIMEOUT duren,
+        # zodat de client zelf niet het saturatiepunt bepaalt
+        workers = max(self.concurrency, math.ceil(max_rate * REQUEST_TIMEOUT))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            while rate <= max_rate:
+                print(f"\n📈 Step: {rate} req/sec")
+                if metrics_urls:
+                    before = scrape_metrics(metrics_urls)
+                    # active_orders is een gauge: tijdens de stap samplen, na afloop is hij ~0
+                    sampler = MetricsSampler(metrics_urls, metrics_interval).start()
+                result = self.run_step(rate, step_duration, executor)
+                
+                if metrics_urls:
+                    active = sampler.stop()
+                    after = scrape_metrics(metrics_urls)
+                    count = after['order_processing_duration_seconds_count'] - before['order_processing_duration_seconds_count']
+                    total = after['order_processing_duration_seconds_sum'] - before['order_processing_duration_seconds_sum']
+                    result['active_orders_max'] = max(active) if active else None
+                    result['active_orders_mean'] = sum(active) / len(active) if active else None
+                    result['server_processing_avg'] = total / count if count > 0 else None
+                
+                result['within_slo'] = (
+                    result['latency_p99'] is not None
+                    and result['latency_p99'] <= slo_p99
+                    and result['error_rate'] <= max_error_rate
+                )
+                steps.append(result)
+                
+                p99 = result['latency_p99']
+                print(f"   throughput {result['throughput']:.2f} req/s | "
+                      f"p50 {result['latency_p50'] or 0:.3f}s | p99 {p99 or 0:.3f}s | "
+                      f"errors {result['error_rate'] * 100:.1f}% | "
+                      f"{'✓ SLO' if result['within_slo'] else '✗ SLO'}")
+                
+                rate += step
+        
+        report = self.capacity_report(steps, slo_p99, max_error_rate, replicas, target_rate)
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        
+        self.print_capacity_report(report)
+        print(f"\nReport geschreven naar {report_path}")
+        return report
+    
+    def capacity_report(self, steps, slo_p99, max_error_rate, replicas, target_rate):
+        """
+        Analyseer de stappen:
+        - saturatiepunt: eerste stap waar de throughput < 90% van de aangeboden rate blijft
+        - max sustainable rate: hoogste rate waarbij deze en alle lagere stappen binnen de SLO blijven
+        """
+        saturation = next(
+            (s['offered_rate'] for s in steps if s['throughput'] < 0.9 * s['offered_rate']),
+            None
+        )
+        
+        max_sustainable = None
+        for s in steps:
+            if not s['within_slo']:
+                break
+            max_sustainable = s['offered_rate']
+        
+        report = {
+            "generated_at": datetime.now().isoformat(),
+            "slo": {"latency_p99": slo_p99, "max_error_rate": max_error_rate},
+            "replicas": replicas,
+            "steps": steps,
+            "saturation_rate": saturation,
+            "max_sustainable_rate": max_sustainable,
+        }
+        
+        if max_sustainable:
+            per_replica = max_sustainable / replicas
+            report["per_replica_rate"] = per_replica
+            if target_rate:
+                report["target_rate"] = target_rate
+                report["recommended_replicas"] = math.ceil(target_rate / per_replica)
+        return report
+    
+    def print_capacity_report(self, report):
+        """Print capacity report"""
+        print("\n" + "=" * 60)
+        print("📐 CAPACITY REPORT")
+        print("=" * 60)
+        print(f"{'Rate':>6} {'Thruput':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'Errors':>7} {'Active':>11}  SLO")
+        for s in report['steps']:
+            active = s.get('active_orders_max')
+            active = None if active is None else f"{active:.0f}/{s['active_orders_mean']:.1f}"
+            print(f"{s['offered_rate']:>6} {s['throughput']:>8.2f} "
+                  f"{s['latency_p50'] or 0:>7.3f} {s['latency_p95'] or 0:>7.3f} {s['latency_p99'] or 0:>7.3f} "
+                  f"{s['error_rate'] * 100:>6.1f}% {active or '-':>11}  "
+                  f"{'✓' if s['within_slo'] else '✗'}")
+        print("-" * 60)
+        saturation = report['saturation_rate']
+        sustainable = report['max_sustainable_rate']
+        print(f"Saturation point:      {f'{saturation} req/sec' if saturation else 'not reached'}")
+        print(f"Max sustainable rate:  {f'{sustainable} req/sec' if sustainable else 'none within SLO'} "
+              f"({report['replicas']} replicas)")
+        if 'per_replica_rate' in report:
+            print(f"Per replica:           {report['per_replica_rate']:.2f} req/sec")
+        if 'recommended_replicas' in report:
+            print(f"Recommended replicas:  {report['recommended_replicas']} for {report['target_rate']} req/sec")
+        print("=" * 60)
+    
     def error_scenario(self, duration_minutes=2):
         """
         Simuleer errors door hoge load + timeouts
@@ -178,11 +407,26 @@ class LoadGenerator:
 def main():
     parser = argparse.ArgumentParser(description='Load Generator voor Instana Demo')
     parser.add_argument('--url', required=True, help='Base URL van frontend service')
-    parser.add_argument('--scenario', choices=['normal', 'spike', 'gradual', 'error', 'mixed'], 
+    parser.add_argument('--scenario', choices=['normal', 'spike', 'gradual', 'error', 'mixed', 'capacity'], 
                        default='mixed', help='Load scenario')
     parser.add_argument('--duration', type=int, default=10, help='Duration in minutes')
     parser.add_argument('--concurrency', type=int, default=5, help='Concurrent requests')
     
+    # Capacity scenario
+    parser.add_argument('--start-rate', type=int, default=2, help='Capacity: start rate (req/sec)')
+    parser.add_argument('--max-rate', type=int, default=20, help='Capacity: max rate (req/sec)')
+    parser.add_argument('--step', type=int, default=2, help='Capacity: rate verhoging per stap')
+    parser.add_argument('--step-duration', type=int, default=60, help='Capacity: seconden per stap')
+    parser.add_argument('--slo-p99', type=float, default=2.0, help='Capacity: p99 latency SLO in seconden')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Capacity: max error rate (0-1)')
+    parser.add_argument('--metrics-url', action='append', default=[],
+                       help='Capacity: /metrics url van een order-service pod (herhaalbaar)')
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                        help='Capacity: seconden tussen active_orders scrapes tijdens een stap')
+    parser.add_argument('--replicas', type=int, default=2, help='Capacity: huidig aantal order-service replicas')
+    parser.add_argument('--target-rate', type=float, help='Capacity: verwachte piek rate voor replica advies')
+    parser.add_argument('--report', default='capacity-report.json', help='Capacity: report bestand')
+    
     args = parser.parse_args()
     
     print(f"""
@@ -209,6 +453,20 @@ Started:    {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             generator.error_scenario(duration_minutes=args.duration)
         elif args.scenario == 'mixed':
             generator.mixed_scenario(duration_minutes=args.duration)
+        elif args.scenario == 'capacity':
+            generator.capacity_test(
+                start_rate=args.start_rate,
+                max_rate=args.max_rate,
+                step=args.step,
+                step_duration=args.step_duration,
+                slo_p99=args.slo_p99,
+                max_error_rate=args.max_error_rate,
+                metrics_urls=args.metrics_url,
+                metrics_interval=args.metrics_interval,
+                replicas=args.replicas,
+                target_rate=args.target_rate,
+                report_path=args.report
+            )
     
     except KeyboardInterrupt:
         print("\n\n⚠️  Load test interrupted by user")
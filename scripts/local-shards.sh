@@ -0,0 +1,41 @@
+#!/usr/bin/env bash
+#
+# Start meerdere lokale Postgres instances om DB routing/sharding van de order service te testen
+#
+#   ./scripts/local-shards.sh start 2    # 2 shards op poort 5433 en 5434
+#   ./scripts/local-shards.sh stop 2
+#
+# Het script print de DB_SHARDS waarde. Een tweede host per shard als "replica"
+# mag naar dezelfde instance wijzen (bv. "localhost:5433,127.0.0.1:5433"),
+# de router maakt geen verschil tussen echte en gesimuleerde replicas.
+#
+set -euo pipefail
+
+ACTION=${1:-start}
+SHARDS=${2:-2}
+BASE_PORT=${BASE_PORT:-5433}
+RUNTIME=$(command -v podman || command -v docker)
+
+spec=""
+for ((i = 0; i < SHARDS; i++)); do
+    name="orders-shard-$i"
+    port=$((BASE_PORT + i))
+    case "$ACTION" in
+        start)
+            "$RUNTIME" run -d --rm --name "$name" -p "$port:5432" \
+                -e POSTGRES_USER=admin -e POSTGRES_PASSWORD=password123 -e POSTGRES_DB=orders \
+                postgres:15-alpine >/dev/null
+            echo "Started $name on port $port"
+            spec="${spec:+$spec;}localhost:$port"
+            ;;
+        stop)
+            "$RUNTIME" stop "$name" >/dev/null && echo "Stopped $name" || true
+            ;;
+    esac
+done
+
+if [ "$ACTION" = "start" ]; then
+    echo
+    echo "export DB_SHARDS=\"$spec\""
+    echo "cd order && python app.py"
+fi
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tracing Benchmark - overhead per request met tracing aan vs uit
+Meet een Flask request met twee child spans (zoals een request met twee DB queries)
+via de test client, zonder netwerk, zodat alleen de tracing kosten zichtbaar zijn.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'order'))
+import tracing
+
+
+def build_app(tracer):
+    app = Flask('bench')
+    if tracer is not None:
+        tracing.instrument_flask(app, tracer)
+
+    @app.route('/orders/<int:order_id>')
+    def get_order(order_id):
+        if tracer is None:
+            return {"id": order_id}
+        with tracer.span('postgres SELECT', kind='client', attributes={"db.statement": "SELECT 1"}):
+            pass
+        with tracer.span('postgres SELECT', kind='client', attributes={"db.statement": "SELECT 2"}):
+            pass
+        return {"id": order_id}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tracing overhead benchmark')
+    parser.add_argument('--number', type=int, default=2000, help='Requests per meting')
+    parser.add_argument('--repeat', type=int, default=5, help='Herhalingen per mode')
+    args = parser.parse_args()
+
+    export_file = os.path.join(tempfile.mkdtemp(), 'spans.jsonl')
+    exporter = tracing.BatchExporter('bench', path=export_file, buffer_size=65536)
+
+    modes = [
+        ('off', None),
+        ('on, sample 0%', tracing.Tracer(exporter, sample_rate=0.0)),
+        ('on, sample 10%', tracing.Tracer(exporter, sample_rate=0.1)),
+        ('on, sample 100%', tracing.Tracer(exporter, sample_rate=1.0)),
+        ('on, tail only (>1s)', tracing.Tracer(exporter, sample_rate=0.0, tail_latency_ms=1000)),
+    ]
+
+    print(f"{'Mode':<22} {'us/request':>12} {'overhead':>10}")
+    print("=" * 46)
+    baseline = None
+    for name, tracer in modes:
+        client = build_app(tracer).test_client()
+        client.get('/orders/1')
+        # Beste van een aantal herhalingen, om ruis van GC en andere threads te dempen
+        runs = timeit.repeat(lambda: client.get('/orders/1'), number=args.number, repeat=args.repeat)
+        per_request = min(runs) / args.number * 1e6
+        if baseline is None:
+            baseline = per_request
+        print(f"{name:<22} {per_request:>12.1f} {per_request - baseline:>+9.1f}")
+
+    exporter.flush()
+    print(f"\nSpans geschreven naar {export_file}")
+
+
+if __name__ == '__main__':
+    main()